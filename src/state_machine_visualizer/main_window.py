@@ -1,18 +1,34 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
+import functools
 import os
+import queue
+import threading
 
 from state_machine_visualizer.style import Style
 from state_machine_visualizer.theme import COLORS, SIZES
-from state_machine_visualizer.settings_window import SettingsWindow
-from state_machine_visualizer.simulator import CGMLParser
-from state_machine_visualizer.visualizers import get_visualizer_class
+
+
+# Типы файлов для диалога загрузки
+_GRAPHML_FILETYPES = (("GraphML файлы", "*.graphml"),
+                      ("Все файлы", "*.*"),)
+
+# Период опроса результата разбора файла, мс
+_PARSE_POLL_MS = 50
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_visualizer_class(platform: str):
+    """Возвращает класс визуализатора, запоминая результат для платформы."""
+    from state_machine_visualizer.visualizers import get_visualizer_class
+    return get_visualizer_class(platform)
 
 
 class MainApp(tk.Tk):
     def __init__(self):
         super().__init__()
-        self.title("Визуализатор машин состояний")
+        self._last_title = "Визуализатор машин состояний"
+        self.title(self._last_title)
         self.geometry("1000x600")
         self.configure(bg=COLORS['main_bg'])
 
@@ -23,7 +39,9 @@ class MainApp(tk.Tk):
         self.file_path = tk.StringVar()
 
         # Переменные для хранения данных
-        self.cgml_parser = CGMLParser()
+        # Парсер создается при первой загрузке файла, чтобы не импортировать
+        # симулятор до появления окна
+        self.cgml_parser = None
         self.current_visualizer = None
         self.state_machine_data = None
 
@@ -59,113 +77,172 @@ class MainApp(tk.Tk):
         self.main_area.pack(side=tk.RIGHT, fill=tk.BOTH,
                             expand=True, padx=20, pady=20)
 
+        # Страницы основной области создаются один раз и только переключаются
+        self._current_page = None
+
         # Заглушка для будущего модуля
-        placeholder = ttk.Label(self.main_area,
+        self._placeholder_frame = ttk.Frame(self.main_area, style='Main.TFrame')
+        placeholder = ttk.Label(self._placeholder_frame,
                                 text="Загрузите GraphML файл для начала работы",
                                 style='Title.TLabel')
         placeholder.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
 
+        # Страница с сообщением об ошибке
+        self._error_frame = ttk.Frame(self.main_area, style='Main.TFrame')
+        self._error_label = ttk.Label(self._error_frame,
+                                      style='Title.TLabel', foreground='red')
+        self._error_label.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+
+        # Контейнер для виджета визуализатора
+        self._visualizer_frame = ttk.Frame(self.main_area, style='Main.TFrame')
+
+        self.show_page(self._placeholder_frame)
+
+    def show_page(self, page: ttk.Frame):
+        """Показывает в основной области одну из страниц, скрывая текущую."""
+        if page is self._current_page:
+            return
+        if self._current_page is not None:
+            self._current_page.pack_forget()
+        page.pack(fill=tk.BOTH, expand=True)
+        self._current_page = page
+
     def load_file(self):
-        """Загружает GraphML файл и парсит его с помощью CGMLParser."""
+        """Загружает GraphML файл и парсит его с помощью CGMLParser.
+
+        Чтение и разбор файла выполняются в фоновом потоке, чтобы окно
+        не зависало на больших файлах. Поток кладет результат в очередь,
+        а главный поток опрашивает ее через after: вызывать Tk из
+        фонового потока нельзя.
+        """
         file_path = filedialog.askopenfilename(
             title="Выберите GraphML файл",
-            filetypes=(("GraphML файлы", "*.graphml"),
-                       ("Все файлы", "*.*"),)
+            filetypes=_GRAPHML_FILETYPES
         )
 
         if file_path:
-            try:
-                # Читаем файл
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    graphml_content = f.read()
-
-                # Парсим с помощью CGMLParser
-                elements = self.cgml_parser.parse_cgml(graphml_content)
-
-                # Получаем первую машину состояний
-                if elements.state_machines:
-                    # Берем первую машину состояний
-                    first_machine_id = list(elements.state_machines.keys())[0]
-                    state_machine = elements.state_machines[first_machine_id]
-
-                    # Извлекаем название платформы
-                    platform = state_machine.platform
-                    print(f"Найдена платформа: {platform}")
-
-                    # Сохраняем данные машины состояний
-                    self.state_machine_data = {
-                        'platform': platform,
-                        'name': state_machine.name,
-                        'states': state_machine.states,
-                        'transitions': state_machine.transitions,
-                        'components': state_machine.components,
-                        'meta': state_machine.meta,
-                        'cgml_state_machine': state_machine  # Сохраняем полный CGMLStateMachine
-                    }
-
-                    # Показываем имя файла в заголовке приложения
-                    filename = os.path.basename(file_path)
-                    self.title(f"Визуализатор машин состояний [{filename}]")
-
-                    # Проверяем, совпадает ли платформа с текущей
-                    current_platform = None
-                    if self.current_visualizer and hasattr(self.current_visualizer, 'state_machine_data'):
-                        current_platform = self.current_visualizer.state_machine_data.get(
-                            'platform'
-                        )
-                    if current_platform and str(current_platform).lower() == str(platform).lower():
-                        print(
-                            f"Платформа совпадает ({platform}), обновляем данные визуализатора."
-                        )
-                        if hasattr(self.current_visualizer, 'update_state_machine_data'):
-                            self.current_visualizer.update_state_machine_data(
-                                self.state_machine_data
-                            )
-                        self.file_path.set(file_path)
-                        self.enable_buttons()
-                        return
-
-                    # Импортируем модуль с нужным визуализатором
-                    print(f"Загружаю визуализатор для платформы: {platform}")
-                    self.load_visualizer(platform)
+            if self.cgml_parser is None:
+                from state_machine_visualizer.simulator import CGMLParser
+                self.cgml_parser = CGMLParser()
+
+            # Пока файл разбирается, повторная загрузка недоступна
+            self.load_btn.config(state='disabled')
+            results = queue.Queue()
+            threading.Thread(target=self._parse_file,
+                             args=(file_path, results), daemon=True).start()
+            self.after(_PARSE_POLL_MS, self._poll_parse_result, results)
+
+    def _parse_file(self, file_path: str, results: queue.Queue):
+        """Читает и парсит файл (выполняется в фоновом потоке).
+
+        Tk здесь не вызывается: результат или исключение кладутся в очередь.
+        """
+        try:
+            # Повторное открытие неизмененного файла берет результат из кэша
+            elements = self.cgml_parser.parse_cgml_file(file_path)
+        except Exception as e:
+            results.put((False, e, file_path))
+            return
+        results.put((True, elements, file_path))
 
+    def _poll_parse_result(self, results: queue.Queue):
+        """Проверяет, закончился ли разбор файла (выполняется в главном потоке)."""
+        try:
+            ok, value, file_path = results.get_nowait()
+        except queue.Empty:
+            self.after(_PARSE_POLL_MS, self._poll_parse_result, results)
+            return
+        if ok:
+            self._on_file_parsed(value, file_path)
+        else:
+            self._on_load_error(value)
+
+    def _on_load_error(self, error: Exception):
+        """Сообщает об ошибке загрузки файла."""
+        self.load_btn.config(state='normal')
+        messagebox.showerror(
+            "Ошибка", f"Ошибка при загрузке файла:\n{str(error)}")
+        print(f"Ошибка при загрузке файла: {error}")
+        self.disable_buttons()  # Блокируем кнопки при ошибке
+
+    def _on_file_parsed(self, elements, file_path: str):
+        """Применяет результат разбора файла (выполняется в главном потоке)."""
+        self.load_btn.config(state='normal')
+        try:
+            # Получаем первую машину состояний
+            if elements.state_machines:
+                # Берем первую машину состояний
+                first_machine_id, state_machine = next(
+                    iter(elements.state_machines.items()))
+
+                # Извлекаем название платформы
+                platform = state_machine.platform
+                print(f"Найдена платформа: {platform}")
+
+                # Сохраняем машину состояний, визуализаторы работают с ней напрямую
+                self.state_machine_data = state_machine
+
+                # Показываем имя файла в заголовке приложения
+                filename = os.path.basename(file_path)
+                title = f"Визуализатор машин состояний [{filename}]"
+                if title != self._last_title:
+                    self.title(title)
+                    self._last_title = title
+
+                # Проверяем, совпадает ли платформа с текущей
+                current_platform = None
+                if self.current_visualizer and self.current_visualizer.state_machine_data:
+                    current_platform = self.current_visualizer.state_machine_data.platform
+                if current_platform and str(current_platform).lower() == str(platform).lower():
+                    print(
+                        f"Платформа совпадает ({platform}), обновляем данные визуализатора."
+                    )
+                    self.current_visualizer.update_state_machine_data(
+                        self.state_machine_data
+                    )
                     self.file_path.set(file_path)
-                    self.enable_buttons()  # Разблокируем кнопки после успешной загрузки
+                    self.enable_buttons()
+                    return
 
-                else:
-                    messagebox.showerror(
-                        "Ошибка", "В файле не найдены машины состояний")
-                    self.disable_buttons()  # Блокируем кнопки при ошибке
+                # Импортируем модуль с нужным визуализатором
+                print(f"Загружаю визуализатор для платформы: {platform}")
+                self.load_visualizer(platform)
+
+                self.file_path.set(file_path)
+                self.enable_buttons()  # Разблокируем кнопки после успешной загрузки
 
-            except Exception as e:
+            else:
                 messagebox.showerror(
-                    "Ошибка", f"Ошибка при загрузке файла:\n{str(e)}")
-                print(f"Ошибка при загрузке файла: {e}")
+                    "Ошибка", "В файле не найдены машины состояний")
                 self.disable_buttons()  # Блокируем кнопки при ошибке
 
+        except Exception as e:
+            self._on_load_error(e)
+
     def load_visualizer(self, platform: str):
         """Загружает визуализатор для указанной платформы."""
         try:
             print(f"Начинаю загрузку визуализатора для платформы: {platform}")
 
-            # Очищаем основную область
-            for widget in self.main_area.winfo_children():
+            # Удаляем виджет предыдущего визуализатора
+            for widget in self._visualizer_frame.winfo_children():
                 widget.destroy()
 
             # Получаем класс визуализатора
             print(f"Ищу класс визуализатора для платформы: {platform}")
-            visualizer_class = get_visualizer_class(platform)
+            visualizer_class = _cached_visualizer_class(str(platform).lower())
             print(f"Найденный класс визуализатора: {visualizer_class}")
 
             if visualizer_class:
                 # Создаем экземпляр визуализатора
                 self.current_visualizer = visualizer_class(
-                    self.main_area, self.state_machine_data)
+                    self._visualizer_frame, self.state_machine_data)
 
                 # Получаем виджет и размещаем его
                 visualizer_widget = self.current_visualizer.get_widget()
                 if visualizer_widget:
                     visualizer_widget.pack(fill=tk.BOTH, expand=True)
+                    self.show_page(self._visualizer_frame)
                 else:
                     self.show_error_message(
                         f"Ошибка создания визуализатора для платформы {platform}")
@@ -198,7 +275,7 @@ class MainApp(tk.Tk):
                 self.current_visualizer.update_with_result(result)
 
                 # Проверяем, был ли краш Gardener
-                if hasattr(result, 'gardener_crashed') and result.gardener_crashed:
+                if result.gardener_crashed:
                     messagebox.showwarning("Предупреждение",
                                            "Gardener упал во время выполнения!\n"
                                            "Поле отображается в состоянии до краша.")
@@ -216,12 +293,8 @@ class MainApp(tk.Tk):
 
     def show_error_message(self, message: str):
         """Показывает сообщение об ошибке в основной области."""
-        for widget in self.main_area.winfo_children():
-            widget.destroy()
-
-        error_label = ttk.Label(self.main_area, text=message,
-                                style='Title.TLabel', foreground='red')
-        error_label.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+        self._error_label.configure(text=message)
+        self.show_page(self._error_frame)
 
     def enable_buttons(self):
         """Разблокирует кнопки после загрузки файла."""
@@ -240,19 +313,13 @@ class MainApp(tk.Tk):
                 "Предупреждение", "Сначала загрузите файл с машиной состояний")
             return
 
-        # Получаем актуальные настройки от текущего визуализатора
-        visualizer_settings = {}
-        if hasattr(self.current_visualizer, 'get_settings'):
-            visualizer_settings = self.current_visualizer.get_settings()
-
-        settings_win = SettingsWindow(self, visualizer_settings)
-        if hasattr(settings_win, 'refresh_widgets'):
-            settings_win.refresh_widgets(visualizer_settings)
+        from state_machine_visualizer.settings_window import SettingsWindow
 
-        # Переопределяем метод save_settings, чтобы сохранять настройки в MainApp
-        original_save_settings = settings_win.save_settings
+        # Получаем актуальные настройки от текущего визуализатора
+        visualizer_settings = self.current_visualizer.get_settings()
 
-        def save_and_store():
-            self.visualizer_settings = settings_win.settings.copy()
-            original_save_settings()
-        settings_win.save_settings = save_and_store
+        # После сохранения запоминаем настройки в MainApp
+        settings_win = SettingsWindow(
+            self, visualizer_settings,
+            on_saved=lambda settings: setattr(self, 'visualizer_settings', dict(settings)))
+        settings_win.refresh_widgets(visualizer_settings)
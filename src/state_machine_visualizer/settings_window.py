@@ -2,70 +2,118 @@ import tkinter as tk
 from tkinter import ttk
 import json
 import os
+from itertools import zip_longest
+from pathlib import Path
+from typing import Callable, Optional
 from state_machine_visualizer.theme import COLORS
 
 
+ORIENTATIONS = ["Север", "Юг", "Запад", "Восток"]
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, indent=4).encode()
+
+
+# Содержимое settings.json (сырые байты и разобранный словарь) и его отметка
+# (mtime в наносекундах и размер): файл перечитывается, только если она поменялась
+_settings_cache = {'stamp': None, 'data': None, 'raw': None}
+
+
+def _settings_stamp():
+    """Возвращает (st_mtime_ns, st_size) для settings.json или None, если файла нет.
+
+    Размер учитывается потому, что на файловых системах с грубым mtime две
+    записи подряд могут получить одинаковое время изменения.
+    """
+    try:
+        st = os.stat("settings.json")
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
 class SettingsWindow:
     def refresh_widgets(self, new_settings=None):
-        """Обновляет содержимое окна настроек динамически."""
+        """Обновляет содержимое окна настроек динамически.
+
+        Строки настроек не пересоздаются: уже созданные метка и поле ввода
+        переиспользуются, а лишние строки скрываются через grid_remove.
+        """
         if new_settings is not None:
             self.settings = new_settings
-        # Очищаем содержимое scrollable_frame, но сохраняем кнопку
-        for widget in self.scrollable_frame.winfo_children():
-            if hasattr(self, 'button_frame') and widget != self.button_frame:
-                widget.destroy()
-            elif not hasattr(self, 'button_frame'):
-                widget.destroy()
-
-        # Заголовки таблицы
-        ttk.Label(self.scrollable_frame, text="Название",
-                  style='Settings.TLabel', font=('Segoe UI', 10, 'bold')).grid(
-            row=0, column=0, padx=10, pady=8, sticky="w")
-        ttk.Label(self.scrollable_frame, text="Значение",
-                  style='Settings.TLabel', font=('Segoe UI', 10, 'bold')).grid(
-            row=0, column=1, padx=10, pady=8, sticky="w")
+        self._frame_dirty = True
 
-        # Загрузка существующих настроек
         self.entries = {}
-        if self.settings:
-            for i, (key, value) in enumerate(self.settings.items(), start=1):
-                ttk.Label(self.scrollable_frame, text=key, style='Settings.TLabel').grid(
-                    row=i, column=0, padx=10, pady=6, sticky="w")
-
-                if key == "Ориентация":
-                    directions = ["Север", "Юг", "Запад", "Восток"]
-                    entry = ttk.Combobox(self.scrollable_frame, values=directions, state="readonly")
-                    if value in directions:
-                        entry.set(value)
-                    else:
-                        entry.set("Север")
-                    entry.grid(row=i, column=1, padx=10, pady=6, sticky="ew")
-                else:
-                    entry = ttk.Entry(self.scrollable_frame, style='Custom.TEntry')
-                    entry.insert(0, value)
-                    entry.grid(row=i, column=1, padx=10, pady=6, sticky="ew")
-                self.entries[key] = entry
-        else:
-            ttk.Label(self.scrollable_frame, text="Нет доступных настроек.", style='Settings.TLabel').grid(
-                row=1, column=0, columnspan=2, padx=10, pady=20, sticky="w")
+        items = list(self.settings.items()) if self.settings else []
 
-        self.scrollable_frame.columnconfigure(1, weight=1)
+        self._fill_rows(items)
 
-        # Создаем или обновляем позицию кнопки сохранения
-        if not hasattr(self, 'button_frame'):
-            self.create_save_button()
-        
-        # Обновляем позицию кнопки
-        button_row = len(self.settings) + 2 if self.settings else 2
+        if items:
+            self.empty_label.grid_remove()
+        else:
+            self.empty_label.grid(row=1, column=0, columnspan=2,
+                                  padx=10, pady=20, sticky="w")
+
+        # Обновляем позицию кнопки сохранения
+        button_row = len(items) + 2 if items else 2
         self.button_frame.grid(row=button_row, column=0,
                               columnspan=2, sticky="ew", pady=(20, 0))
 
-    def __init__(self, parent, visualizer_settings=None):
+    def _fill_rows(self, items):
+        """Заполняет строки настроек, переиспользуя строки из пула."""
+        for i, (item, row) in enumerate(zip_longest(items, tuple(self._row_pool)), start=1):
+            if item is None:
+                # Лишние строки скрываем, чтобы переиспользовать их позже
+                label, entry = row
+                label.grid_remove()
+                entry.grid_remove()
+                continue
+
+            key, value = item
+            is_orientation = key == "Ориентация"
+            if row is None:
+                label = ttk.Label(self.scrollable_frame, style='Settings.TLabel')
+                entry = self._create_entry(is_orientation)
+                self._row_pool.append((label, entry))
+            else:
+                label, entry = row
+                if isinstance(entry, ttk.Combobox) != is_orientation:
+                    entry.destroy()
+                    entry = self._create_entry(is_orientation)
+                    self._row_pool[i - 1] = (label, entry)
+
+            label.configure(text=key)
+            label.grid(row=i, column=0, padx=10, pady=6, sticky="w")
+            if is_orientation:
+                entry.set(value if value in ORIENTATIONS else "Север")
+            else:
+                entry.delete(0, tk.END)
+                entry.insert(0, value)
+            entry.grid(row=i, column=1, padx=10, pady=6, sticky="ew")
+            self.entries[key] = entry
+
+    def _create_entry(self, is_orientation: bool):
+        """Создает поле ввода для строки настроек."""
+        if is_orientation:
+            return ttk.Combobox(self.scrollable_frame,
+                                values=ORIENTATIONS, state="readonly")
+        return ttk.Entry(self.scrollable_frame, style='Custom.TEntry')
+
+    def __init__(self, parent, visualizer_settings=None,
+                 on_saved: Optional[Callable[[dict], None]] = None):
         self.parent = parent
         self.visualizer_settings = visualizer_settings or {}
+        self.on_saved = on_saved  # вызывается с итоговыми настройками после сохранения
         self.settings = {}
         self.load_settings()  # settings и visualizer_settings будут заполнены
 
+        # Отложенная обработка <Configure> и кэш ширины содержимого
+        self._configure_after_id = None
+        self._frame_reqwidth = 0
+        self._frame_dirty = True
+        self._last_center_x = None
+
         self.window = tk.Toplevel(parent)
         self.window.title("Настройки")
         self.window.configure(bg=COLORS['settings_bg'])
@@ -74,18 +122,6 @@ class SettingsWindow:
 
         self.create_widgets()  # теперь виджеты создаются только после загрузки настроек
     # Центрируем окно только после полной отрисовки (см. adjust_window_size)
-    # self.center_window()  # убрано отсюда
-
-    def center_window(self):
-        """Центрирует окно относительно родительского"""
-        self.window.update_idletasks()
-        width = self.window.winfo_width()
-        height = self.window.winfo_height()
-
-        x = (self.window.winfo_screenwidth() // 2) - (width // 2)
-        y = (self.window.winfo_screenheight() // 2) - (height // 2)
-
-        self.window.geometry(f'{width}x{height}+{x}+{y}')
 
     def create_widgets(self):
         # Основной фрейм
@@ -102,8 +138,10 @@ class SettingsWindow:
         container.pack(fill=tk.BOTH, expand=True)
 
         # Создаем Canvas и Scrollbar
+        # Шаг прокрутки фиксирован (примерно высота строки настроек)
         self.canvas = tk.Canvas(
-            container, bg=COLORS['settings_bg'], highlightthickness=0)
+            container, bg=COLORS['settings_bg'], highlightthickness=0,
+            yscrollincrement=24)
         scrollbar = ttk.Scrollbar(
             container, orient="vertical", command=self.canvas.yview)
 
@@ -111,13 +149,11 @@ class SettingsWindow:
         self.scrollable_frame = ttk.Frame(self.canvas, style='Settings.TFrame')
 
         # Привязываем изменение размера фрейма к Canvas
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.on_frame_configure(self.canvas)
-        )
+        self.scrollable_frame.bind("<Configure>", self.on_frame_configure)
 
         # Создаем окно в Canvas для фрейма с центрированием
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
+        self._canvas_item_id = self.canvas.create_window(
+            (0, 0), window=self.scrollable_frame, anchor="nw")
         self.canvas.configure(yscrollcommand=scrollbar.set)
 
         # Упаковываем Canvas и Scrollbar
@@ -125,56 +161,39 @@ class SettingsWindow:
         scrollbar.pack(side="right", fill="y")
 
         # Привязываем изменение размера Canvas для центрирования содержимого
-        self.canvas.bind('<Configure>', lambda e: self.center_content(self.canvas))
+        self.canvas.bind('<Configure>', self.schedule_configure)
 
         # Заголовки таблицы
         ttk.Label(self.scrollable_frame, text="Название",
-                  style='Settings.TLabel', font=('Segoe UI', 10, 'bold')).grid(
+                  style='SettingsHeader.TLabel').grid(
             row=0, column=0, padx=10, pady=8, sticky="w")
         ttk.Label(self.scrollable_frame, text="Значение",
-                  style='Settings.TLabel', font=('Segoe UI', 10, 'bold')).grid(
+                  style='SettingsHeader.TLabel').grid(
             row=0, column=1, padx=10, pady=8, sticky="w")
 
-        # Загрузка существующих настроек
-        self.entries = {}
-        if self.settings:
-            # Определяем, Gardener ли это (по ключам или платформе)
-            platform = ''
-            if 'platform' in self.settings:
-                platform = str(self.settings['platform']).lower()
-            elif self.visualizer_settings and 'platform' in self.visualizer_settings:
-                platform = str(self.visualizer_settings['platform']).lower()
-            is_gardener = 'gardener' in platform
-            for i, (key, value) in enumerate(self.settings.items(), start=1):
-                ttk.Label(self.scrollable_frame, text=key, style='Settings.TLabel').grid(
-                    row=i, column=0, padx=10, pady=6, sticky="w")
-
-                if key == "Ориентация" and is_gardener:
-                    entry = ttk.Combobox(self.scrollable_frame, values=[
-                                         "Север", "Юг", "Запад", "Восток"], state="readonly")
-                    entry.set(value)
-                    entry.grid(row=i, column=1, padx=10, pady=6, sticky="ew")
-                else:
-                    entry = ttk.Entry(self.scrollable_frame,
-                                      style='Custom.TEntry')
-                    entry.insert(0, value)
-                    entry.grid(row=i, column=1, padx=10, pady=6, sticky="ew")
-                self.entries[key] = entry
-        else:
-            # Если настроек нет, показываем заглушку
-            ttk.Label(self.scrollable_frame, text="Нет доступных настроек.", style='Settings.TLabel').grid(
-                row=1, column=0, columnspan=2, padx=10, pady=20, sticky="w")
+        # Заглушка на случай, если настроек нет
+        self.empty_label = ttk.Label(self.scrollable_frame, text="Нет доступных настроек.",
+                                     style='Settings.TLabel')
+
+        # Кнопка сохранения создается один раз, refresh_widgets только
+        # переносит ее под последнюю строку
+        self.create_save_button()
+
+        # Строки настроек
+        self._row_pool = []
+        self.refresh_widgets()
 
         # Настройка весов колонок для растяжения
         self.scrollable_frame.columnconfigure(1, weight=1)
 
-        # Кнопка сохранения будет создана в refresh_widgets
+        self.window.bind('<Destroy>', self.on_window_destroy)
 
-        # Привязываем обработчик изменения размера
-        self.window.bind('<Configure>', self.on_window_configure)
+        # Прокрутка колесом мыши в любом месте окна (Button-4/5 - X11)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.window.bind(sequence, self.on_mousewheel)
 
-        # Обновляем геометрию после создания виджетов
-        self.window.after(100, self.adjust_window_size)
+        # Обновляем геометрию, как только окно впервые появится на экране
+        self.window.bind('<Map>', self.on_window_map)
 
     def create_save_button(self):
         """Создает кнопку сохранения внизу окна"""
@@ -188,18 +207,36 @@ class SettingsWindow:
                                   style='Primary.TButton')
         self.save_btn.pack(pady=10)
 
-    def on_frame_configure(self, canvas):
-        """Обновляет область прокрутки при изменении размера фрейма"""
-        canvas.configure(scrollregion=canvas.bbox("all"))
-        # Центрируем содержимое после обновления
-        self.center_content(canvas)
+    def on_frame_configure(self, event=None):
+        """Отмечает изменение размера содержимого и планирует обновление"""
+        self._frame_dirty = True
+        self.schedule_configure()
+
+    def schedule_configure(self, event=None):
+        """Откладывает пересчет прокрутки до простоя цикла событий Tk.
+
+        Пачка событий <Configure> схлопывается в один пересчет без
+        задержки по таймеру: пока пересчет запланирован, новые события
+        ничего не делают.
+        """
+        if self._configure_after_id is not None:
+            return
+        self._configure_after_id = self.window.after_idle(self._do_configure)
+
+    def _do_configure(self):
+        """Обновляет область прокрутки и центрирует содержимое"""
+        self._configure_after_id = None
+        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        self.center_content(self.canvas)
 
     def center_content(self, canvas):
         """Центрирует содержимое в Canvas"""
-        canvas.update_idletasks()
         # Получаем размеры Canvas и содержимого
         canvas_width = canvas.winfo_width()
-        frame_width = self.scrollable_frame.winfo_reqwidth()
+        if self._frame_dirty:
+            self._frame_reqwidth = self.scrollable_frame.winfo_reqwidth()
+            self._frame_dirty = False
+        frame_width = self._frame_reqwidth
         
         # Вычисляем позицию для центрирования
         if frame_width < canvas_width:
@@ -207,15 +244,36 @@ class SettingsWindow:
         else:
             x = 0
         
-        # Обновляем позицию окна в Canvas
-        if canvas.find_all():
-            canvas.coords(canvas.find_all()[0], x, 0)
-
-    def on_window_configure(self, event):
-        """Обрабатывает изменение размера окна"""
+        # Обновляем позицию окна в Canvas, только если она изменилась
+        if x == self._last_center_x:
+            return
+        self._last_center_x = x
+        canvas.coords(self._canvas_item_id, x, 0)
+
+    def on_mousewheel(self, event):
+        """Прокручивает содержимое на один шаг за щелчок колеса"""
+        # Колесо над списком выбора уже обработано его классовой привязкой
+        # (смена значения), прокручивать окно при этом не нужно
+        if isinstance(event.widget, ttk.Combobox):
+            return None
+        if event.num == 4 or event.delta > 0:
+            self.canvas.yview_scroll(-1, "units")
+        elif event.num == 5 or event.delta < 0:
+            self.canvas.yview_scroll(1, "units")
+        return "break"
+
+    def on_window_map(self, event):
+        """Подстраивает размер окна при первом отображении"""
+        # <Map> приходит и от дочерних виджетов, реагируем только на само окно
         if event.widget == self.window:
-            # Можно добавить дополнительную логику при изменении размера
-            pass
+            self.window.unbind('<Map>')
+            self.adjust_window_size()
+
+    def on_window_destroy(self, event):
+        """Отменяет отложенную обработку <Configure> при закрытии окна"""
+        if event.widget == self.window and self._configure_after_id is not None:
+            self.window.after_cancel(self._configure_after_id)
+            self._configure_after_id = None
 
     def adjust_window_size(self):
         """Автоматически подстраивает размер окна под содержимое"""
@@ -226,39 +284,34 @@ class SettingsWindow:
         content_height = self.scrollable_frame.winfo_reqheight() + \
             150  # + заголовок и кнопка
 
-        # Ограничиваем максимальный размер
-        max_width = min(content_width, 800)
-        max_height = min(content_height, 600)
-
-        # Устанавливаем размер окна
-        self.window.geometry(f"{max_width}x{max_height}")
+        # Ограничиваем максимальный размер (и минимальный, см. minsize)
+        width = max(min(content_width, 800), 400)
+        height = max(min(content_height, 600), 300)
 
-        # Центрируем окно
-        self.center_window()
+        # Устанавливаем размер окна и сразу центрируем его на экране
+        x = (self.window.winfo_screenwidth() // 2) - (width // 2)
+        y = (self.window.winfo_screenheight() // 2) - (height // 2)
+        self.window.geometry(f"{width}x{height}+{x}+{y}")
 
     def load_settings(self):
-        # Начинаем с настроек визуализатора (они имеют приоритет)
-        self.settings = {}
-
-        # Добавляем настройки визуализатора
-        for key, value in self.visualizer_settings.items():
-            self.settings[key] = value
-
-        # Загружаем базовые настройки (только те, которых нет в настройках визуализатора)
-        if os.path.exists("settings.json"):
-            with open("settings.json", "r") as f:
-                basic_settings = json.load(f)
-                for key, value in basic_settings.items():
-                    if key not in self.visualizer_settings:
-                        self.settings[key] = value
+        # Загружаем базовые настройки
+        stamp = _settings_stamp()
+        if stamp is not None:
+            if stamp != _settings_cache['stamp']:
+                raw = Path("settings.json").read_bytes()
+                # json.loads сам определяет кодировку байтов
+                _settings_cache['data'] = json.loads(raw)
+                _settings_cache['raw'] = raw
+                _settings_cache['stamp'] = stamp
+            basic_settings = _settings_cache['data']
         else:
             # Базовые настройки по умолчанию
-            default_basic_settings = {
-            }
-            for key, value in default_basic_settings.items():
-                if key not in self.visualizer_settings:
-                    self.settings[key] = value
+            basic_settings = {}
 
+        # Настройки визуализатора идут первыми и имеют приоритет: первая
+        # распаковка задает порядок ключей, последняя - значения
+        self.settings = {**self.visualizer_settings, **basic_settings,
+                         **self.visualizer_settings}
 
     def save_settings(self):
         # Собираем настройки из полей ввода
@@ -268,15 +321,26 @@ class SettingsWindow:
         # Сохраняем базовые настройки в файл (исключаем настройки визуализатора)
         basic_settings = {k: v for k, v in self.settings.items()
                           if k not in self.visualizer_settings}
-        with open("settings.json", "w") as f:
-            json.dump(basic_settings, f, indent=4)
+        # Перезаписываем файл, только если его содержимое действительно изменится
+        raw = _dumps(basic_settings)
+        stamp = _settings_stamp()
+        if stamp is None or stamp != _settings_cache['stamp'] \
+                or raw != _settings_cache['raw']:
+            # Пишем во временный файл и подменяем им старый, чтобы при сбое
+            # не остался наполовину записанный settings.json
+            Path("settings.json.tmp").write_bytes(raw)
+            os.replace("settings.json.tmp", "settings.json")
+            _settings_cache['data'] = basic_settings
+            _settings_cache['raw'] = raw
+            _settings_cache['stamp'] = _settings_stamp()
 
         # Применяем настройки к визуализатору
         if hasattr(self.parent, 'current_visualizer') and self.parent.current_visualizer:
             visualizer_settings = {k: v for k, v in self.settings.items()
                                    if k in self.visualizer_settings}
-            if hasattr(self.parent.current_visualizer, 'apply_settings'):
-                self.parent.current_visualizer.apply_settings(
-                    visualizer_settings)
+            self.parent.current_visualizer.apply_settings(visualizer_settings)
+
+        if self.on_saved:
+            self.on_saved(self.settings)
 
         self.window.destroy()
@@ -2,20 +2,26 @@
 State Machine Simulator Bundle
 Combines all modules into a single file for easier distribution and use.
 """
-from copy import deepcopy
 import ast
+import operator
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Union, DefaultDict, Literal,  TypeVar, Any, Callable
+from typing import IO, List, Dict, Optional, Union, DefaultDict, Literal,  TypeVar, Any, Callable
 from collections import defaultdict
 import random
 from collections import deque
 from collections.abc import Iterable
-from functools import partial
+from functools import cached_property, lru_cache, partial
+from itertools import chain
 from abc import ABC
+from enum import IntEnum
 import time
 import sys
 import re
+import os
+import hashlib
+import pickle
+import tempfile
 
 # ============================================================================
 # UTILS.PY
@@ -30,23 +36,56 @@ def to_list(nodes: Union[List[ListType], None, ListType]) -> List[ListType]:
     """Return list of objects."""
     if nodes is None:
         return []
-    if isinstance(nodes, list):
+    # Parser produces plain lists only, identity check is cheaper than isinstance
+    if nodes.__class__ is list:
         return nodes
-    else:
-        return [nodes]
+    return [nodes]
+
+
+_VERTEX_TYPES = frozenset(('choice', 'initial',
+                           'final', 'terminate', 'shallowHistory'))
+_NOTE_TYPES = frozenset(('formal', 'informal'))
 
 
 def is_vertex_type(value: str) -> bool:
     """Check if value is a valid vertex type."""
-    vertex_types = ['choice', 'initial',
-                    'final', 'terminate', 'shallowHistory']
-    return value in vertex_types
+    return value in _VERTEX_TYPES
 
 
 def is_note_type(value: str) -> bool:
     """Check if value is a valid note type."""
-    note_types = ['formal', 'informal']
-    return value in note_types
+    return value in _NOTE_TYPES
+
+
+# Поля, которые в словаре из XML хранятся как атрибуты с префиксом '@'
+_AT_PREFIX_FIELDS = frozenset(
+    ('id', 'source', 'target', 'x', 'y', 'width', 'height', 'key', 'xmlns'))
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=None)
+def _field_aliases(cls) -> tuple:
+    """
+    Return (field name, dictionary keys by priority) pairs for class fields.
+
+    The table depends only on the class, so it is built once per class.
+    """
+    aliases = []
+    for field_name in cls.__annotations__:
+        # Handle field aliasing (like pydantic's Field(alias=...))
+        if field_name == 'for_':
+            dict_key = '@for'
+        elif field_name in _AT_PREFIX_FIELDS:
+            dict_key = f'@{field_name}'
+        elif field_name == 'content':
+            dict_key = '#text'
+        else:
+            dict_key = field_name
+        # '@name' wins over the alias, the alias wins over the plain name
+        keys = tuple(dict.fromkeys((f'@{field_name}', dict_key, field_name)))
+        aliases.append((field_name, keys))
+    return tuple(aliases)
 
 
 def create_object_from_dict(cls, data_dict: dict):
@@ -59,36 +98,14 @@ def create_object_from_dict(cls, data_dict: dict):
         return data_dict
 
     # Get the class annotations to understand expected types
-    import inspect
     if hasattr(cls, '__annotations__'):
-        annotations = cls.__annotations__
         kwargs = {}
-
-        for field_name, field_type in annotations.items():
-            # Handle field aliasing (like pydantic's Field(alias=...))
-            dict_key = field_name
-
-            # Handle special field name mappings
-            if field_name == 'for_':
-                dict_key = '@for'
-            elif field_name in ['id', 'source', 'target', 'x', 'y', 'width', 'height', 'key', 'xmlns']:
-                dict_key = f'@{field_name}'
-            elif field_name == 'content':
-                dict_key = '#text'
-
-            if dict_key in data_dict:
-                value = data_dict[dict_key]
-                kwargs[field_name] = value
-            elif field_name in data_dict:
-                kwargs[field_name] = data_dict[field_name]
-
-        # Handle remaining fields that might not be in annotations
-        for key, value in data_dict.items():
-            if key.startswith('@') and key[1:] in annotations:
-                kwargs[key[1:]] = value
-            elif key == '#text' and 'content' in annotations:
-                kwargs['content'] = value
-
+        for field_name, keys in _field_aliases(cls):
+            for dict_key in keys:
+                value = data_dict.get(dict_key, _MISSING)
+                if value is not _MISSING:
+                    kwargs[field_name] = value
+                    break
         return cls(**kwargs)
     else:
         return cls(**data_dict) if data_dict else cls()
@@ -98,7 +115,40 @@ def create_object_from_dict(cls, data_dict: dict):
 # XML_PARSER.PY
 # ============================================================================
 
-"""Simple XML parser using only standard library."""
+"""Simple XML parser using only standard library (lxml is used if installed)."""
+
+try:
+    # lxml builds the tree several times faster than the standard library,
+    # but it is an optional dependency
+    from lxml import etree as _etree
+    _HAS_LXML = True
+except ImportError:
+    _etree = ET
+    _HAS_LXML = False
+
+_XML_EVENTS = ('start', 'end')
+
+
+@lru_cache(maxsize=256)
+def _strip_ns(tag: str) -> str:
+    """Remove namespace from tag name ('{ns}node' -> 'node')."""
+    return tag.rpartition('}')[2]
+
+
+def _to_number(value: str) -> Union[str, int, float]:
+    """Convert string value to int or float where possible."""
+    # int()/float() accept only strings starting with a digit, sign, dot or
+    # whitespace; the rest are returned as is without raising ValueError
+    first = value[:1]
+    if not (first.isdigit() or first in '+-.' or first.isspace()):
+        return value
+    try:
+        if '.' in value:
+            return float(value)
+        else:
+            return int(value)
+    except ValueError:
+        return value
 
 
 def parse_xml_to_dict(xml_string: str) -> Dict[str, Any]:
@@ -107,70 +157,80 @@ def parse_xml_to_dict(xml_string: str) -> Dict[str, Any]:
 
     This function replaces xmltodict functionality using only standard library.
     """
-    root = ET.fromstring(xml_string)
-    # Remove namespace from root tag
-    root_tag = root.tag
-    if '}' in root_tag:
-        root_tag = root_tag.split('}')[1]
-    return {root_tag: _element_to_dict(root)}
-
-
-def _element_to_dict(element: ET.Element) -> Dict[str, Any]:
-    """Convert XML element to dictionary."""
-    result = {}
-
-    # Add attributes with @ prefix
-    if element.attrib:
-        for key, value in element.attrib.items():
-            # Handle special attribute names
-            if key == 'for':
-                result['@for'] = value
-            else:
-                result[f'@{key}'] = value
+    parser = _etree.XMLPullParser(events=_XML_EVENTS)
+    parser.feed(xml_string)
+    parser.close()
+    return _events_to_dict(parser.read_events())
 
-    # Handle text content
-    if element.text and element.text.strip():
-        result['#text'] = element.text.strip()
 
-    # Handle child elements
-    children = list(element)
-    if children:
-        for child in children:
-            child_dict = _element_to_dict(child)
+def _events_to_dict(events: Iterable) -> Dict[str, Any]:
+    """
+    Build dictionary from (event, element) pairs of start/end parse events.
+
+    The dictionary is assembled on a stack instead of a recursive walk over
+    the finished tree, and every element is cleared right after it was
+    converted, so the element tree and its dictionary copy never coexist in
+    full. Numeric attribute values and texts are converted in the same pass.
+    Attribute names and string values (ids, sources, targets, keys) repeat
+    a lot, so they are interned.
+    """
+    intern = sys.intern
+    root_tag = ''
+    root_dict: Dict[str, Any] = {}
+    stack: List[Dict[str, Any]] = []
+    for event, element in events:
+        if event == 'start':
+            result: Dict[str, Any] = {}
+            for key, value in element.attrib.items():
+                value = _to_number(value)
+                if isinstance(value, str):
+                    value = intern(value)
+                result[intern(f'@{key}')] = value
+            stack.append(result)
+            continue
 
-            # Remove namespace from tag name
-            tag_name = child.tag
-            if '}' in tag_name:
-                tag_name = tag_name.split('}')[1]
+        result = stack.pop()
+        text = element.text
+        if text and text.strip():
+            result['#text'] = _to_number(text.strip())
 
-            if tag_name in result:
-                # Multiple children with same tag - make it a list
-                if not isinstance(result[tag_name], list):
-                    result[tag_name] = [result[tag_name]]
-                result[tag_name].append(child_dict)
+        # Remove namespace from tag name
+        tag_name = _strip_ns(element.tag)
+
+        if not stack:
+            root_tag = tag_name
+            root_dict = result
+        else:
+            parent = stack[-1]
+            # Children are always dicts, so a list here means the tag repeats
+            existing = parent.get(tag_name)
+            if existing is None:
+                parent[tag_name] = result
+            elif existing.__class__ is list:
+                existing.append(result)
             else:
-                result[tag_name] = child_dict
+                # Multiple children with same tag - make it a list
+                parent[tag_name] = [existing, result]
+        element.clear()
+        if _HAS_LXML:
+            # lxml keeps cleared siblings attached to the parent, drop them.
+            # The root has no parent, but getprevious() still returns
+            # comments and processing instructions placed before it.
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+    return {root_tag: root_dict}
 
-    return result
 
+def parse_xml_stream_to_dict(source: Union[str, IO[bytes]]) -> Dict[str, Any]:
+    """
+    Parse XML file (path or binary file object) to dictionary structure.
 
-def _convert_numeric_values(data: Any) -> Any:
-    """Convert string values to appropriate numeric types where possible."""
-    if isinstance(data, dict):
-        return {key: _convert_numeric_values(value) for key,
-                value in data.items()}
-    elif isinstance(data, list):
-        return [_convert_numeric_values(item) for item in data]
-    elif isinstance(data, str):
-        # Try to convert to float
-        try:
-            if '.' in data:
-                return float(data)
-            else:
-                return int(data)
-        except ValueError:
-            return data
-    return data
+    Unlike parse_xml_to_dict, the document is consumed incrementally with
+    iterparse, so the whole source is never kept in memory.
+    """
+    return _events_to_dict(_etree.iterparse(source, events=_XML_EVENTS))
 
 
 def parse(xml_string: str) -> Dict[str, Any]:
@@ -183,8 +243,20 @@ def parse(xml_string: str) -> Dict[str, Any]:
     Returns:
         Dictionary representation of XML
     """
-    result = parse_xml_to_dict(xml_string)
-    return _convert_numeric_values(result)
+    return parse_xml_to_dict(xml_string)
+
+
+def parse_stream(source: Union[str, IO[bytes]]) -> Dict[str, Any]:
+    """
+    Same as parse(), but reads XML incrementally from file path or file object.
+
+    Args:
+        source: path to XML file or file object opened in binary mode
+
+    Returns:
+        Dictionary representation of XML
+    """
+    return parse_xml_stream_to_dict(source)
 
 
 # ============================================================================
@@ -193,6 +265,9 @@ def parse(xml_string: str) -> Dict[str, Any]:
 
 """Module contains types for CyberiadaML scheme using standard library only."""
 
+# Dataclasses use __slots__: schemes produce many small objects, slots make
+# them smaller and speed up attribute access.
+
 
 # Type aliases
 CGMLVertexType = Literal['choice', 'initial',
@@ -201,14 +276,14 @@ CGMLNoteType = Literal['formal', 'informal']
 AvailableKeys = DefaultDict[str, List['CGMLKeyNode']]
 
 
-@dataclass
+@dataclass(slots=True)
 class Point:
     """Point data class."""
     x: float
     y: float
 
 
-@dataclass
+@dataclass(slots=True)
 class Rectangle:
     """Rectangle data class."""
     x: float
@@ -217,7 +292,7 @@ class Rectangle:
     height: float
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLRectNode:
     """The type represents <rect> node."""
     x: float
@@ -226,14 +301,14 @@ class CGMLRectNode:
     height: float
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLPointNode:
     """The type represents <point> node."""
     x: float
     y: float
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLDataNode:
     """The type represents <data> node."""
     key: str
@@ -242,7 +317,7 @@ class CGMLDataNode:
     point: Optional[Union[CGMLPointNode, List[CGMLPointNode]]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLKeyNode:
     """The type represents <key> node."""
     id: str
@@ -251,7 +326,7 @@ class CGMLKeyNode:
     attr_type: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLEdge:
     """The type represents <edge> node."""
     id: str
@@ -260,7 +335,7 @@ class CGMLEdge:
     data: Optional[Union[List[CGMLDataNode], CGMLDataNode]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLGraph:
     """The type represents <graph> node."""
     id: str
@@ -270,7 +345,7 @@ class CGMLGraph:
     edge: Optional[Union[List[CGMLEdge], CGMLEdge]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLNode:
     """The type represents <node> node."""
     id: str
@@ -278,7 +353,7 @@ class CGMLNode:
     data: Optional[Union[List[CGMLDataNode], CGMLDataNode]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLGraphml:
     """The type represents <graphml> node."""
     data: Union[CGMLDataNode, List[CGMLDataNode]]
@@ -287,13 +362,13 @@ class CGMLGraphml:
     graph: Optional[Union[List[CGMLGraph], CGMLGraph]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGML:
     """Root type of CyberiadaML scheme."""
     graphml: CGMLGraphml
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLBaseVertex:
     """
     The type represents pseudo-nodes.
@@ -309,7 +384,7 @@ class CGMLBaseVertex:
     parent: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLState:
     """
     Data class with information about state.
@@ -333,7 +408,7 @@ class CGMLState:
     color: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLComponent:
     """
     Data class with information about component.
@@ -347,7 +422,7 @@ class CGMLComponent:
     parameters: Dict[str, str]
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLInitialState(CGMLBaseVertex):
     """
     Data class with information about initial state (pseudo node).
@@ -358,7 +433,7 @@ class CGMLInitialState(CGMLBaseVertex):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLShallowHistory(CGMLBaseVertex):
     """
     Data class with information about shallow history node (pseudo node).
@@ -369,7 +444,7 @@ class CGMLShallowHistory(CGMLBaseVertex):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLChoice(CGMLBaseVertex):
     """
     Data class with information about choice node (pseudo node).
@@ -380,7 +455,7 @@ class CGMLChoice(CGMLBaseVertex):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLTransition:
     """
     Data class with information about transition(<edge>).
@@ -404,7 +479,7 @@ class CGMLTransition:
     pivot: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLNote:
     """
     Dataclass with information about note.
@@ -424,7 +499,7 @@ class CGMLNote:
     parent: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLMeta:
     """
     The type represents meta-information from formal note with 'dName' CGML_META.
@@ -436,7 +511,7 @@ class CGMLMeta:
     values: Dict[str, str]
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLFinal(CGMLBaseVertex):
     """
     The type represents final-states.
@@ -446,7 +521,7 @@ class CGMLFinal(CGMLBaseVertex):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLTerminate(CGMLBaseVertex):
     """
     The type represents terminate-states.
@@ -456,7 +531,7 @@ class CGMLTerminate(CGMLBaseVertex):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLStateMachine:
     """
     The type represents state machine <graph>.
@@ -483,7 +558,7 @@ class CGMLStateMachine:
     name: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CGMLElements:
     """
     Dataclass with elements of parsed scheme.
@@ -518,38 +593,53 @@ defaultSignals = ['unconditionalTransition', 'break']
 # ============================================================================
 
 class EventLoop:
+    # Уже обработанные события
     events: list = []
+    # Ожидающие обработки события, первое из них будет выдано следующим
+    pending: deque = deque()
     called_events: list = []
-    current_event_idx = 0
-    insert_event_idx = 0
+    # Сколько событий добавлено с момента выдачи последнего события
+    inserted_count = 0
 
     @staticmethod
     def add_event(event: str, is_called=False):
-        """Добавляет событие в цикл событий."""
-        EventLoop.insert_event_idx += 1
-        EventLoop.events.insert(
-            EventLoop.insert_event_idx,
-            event
-        )
+        """Добавляет событие в цикл событий.
+
+        События, добавленные при обработке очередного события, встают в
+        очередь после ближайшего ожидающего события в порядке добавления.
+        Вставка идет в начало deque, поэтому не сдвигает всю очередь.
+        """
+        # Интернируем, чтобы обработчики сравнивали сигналы через is
+        event = sys.intern(event)
+        EventLoop.inserted_count += 1
+        if EventLoop.inserted_count < len(EventLoop.pending):
+            EventLoop.pending.insert(EventLoop.inserted_count, event)
+        else:
+            EventLoop.pending.append(event)
         if is_called:
             EventLoop.called_events.append(event)
 
     @staticmethod
     def clear():
-        EventLoop.current_event_idx = 0
-        EventLoop.events.clear()
-        EventLoop.called_events.clear()
+        EventLoop.events = []
+        EventLoop.pending = deque()
+        EventLoop.called_events = []
+        EventLoop.inserted_count = 0
 
     @staticmethod
     def get_event():
-        # обнулять где-то надо
-        if EventLoop.current_event_idx < len(EventLoop.events):
-            event = EventLoop.events[EventLoop.current_event_idx]
-            EventLoop.current_event_idx += 1
-            EventLoop.insert_event_idx = EventLoop.current_event_idx
+        if EventLoop.pending:
+            event = EventLoop.pending.popleft()
+            EventLoop.events.append(event)
+            EventLoop.inserted_count = 0
             return event
         return None
 
+    @staticmethod
+    def all_events() -> list:
+        """Возвращает обработанные и ожидающие события одним списком."""
+        return EventLoop.events + list(EventLoop.pending)
+
 
 # ============================================================================
 # QHSM.PY
@@ -560,170 +650,277 @@ class EventLoop:
 
 Q_MAX_DEPTH = 8
 
-# Signals as string names
-QEP_EMPTY_SIG_ = "QEP_EMPTY_SIG"
-Q_ENTRY_SIG = "entry"
-Q_EXIT_SIG = "exit"
-Q_INIT_SIG = "Q_INIT_SIG"
-Q_VERTEX_SIG = "Q_VERTEX_SIG"
-Q_USER_SIG = "Q_USER_SIG"
-
-# Return codes
-Q_RET_SUPER = 0
-Q_RET_UNHANDLED = 1
-Q_RET_HANDLED = 2
-Q_RET_IGNORED = 3
-Q_RET_TRAN = 4
+# Signals as string names. They are interned and EventLoop interns every
+# queued event, so handlers may compare signals with `is`
+QEP_EMPTY_SIG_ = sys.intern("QEP_EMPTY_SIG")
+Q_ENTRY_SIG = sys.intern("entry")
+Q_EXIT_SIG = sys.intern("exit")
+Q_INIT_SIG = sys.intern("Q_INIT_SIG")
+Q_VERTEX_SIG = sys.intern("Q_VERTEX_SIG")
+Q_USER_SIG = sys.intern("Q_USER_SIG")
+
+# Return codes. Enum members are singletons, so results are compared with
+# `is`; IntEnum keeps the C-level int hash for the set membership test in
+# QMsm_dispatch
+class QRet(IntEnum):
+    SUPER = 0
+    UNHANDLED = 1
+    HANDLED = 2
+    IGNORED = 3
+    TRAN = 4
+
+
+Q_RET_SUPER = QRet.SUPER
+Q_RET_UNHANDLED = QRet.UNHANDLED
+Q_RET_HANDLED = QRet.HANDLED
+Q_RET_IGNORED = QRet.IGNORED
+Q_RET_TRAN = QRet.TRAN
 
 
 class QHsm:
-    def __init__(self, initial: Optional[Callable[["QHsm", str], int]] = None):
+    # Атрибуты читаются при каждом переходе, слоты быстрее и компактнее __dict__
+    __slots__ = ('current_', 'effective_', 'target_', 'path_', 'parents_',
+                 'chains_')
+
+    current_: Callable[["QHsm", str], QRet]
+    effective_: Callable[["QHsm", str], QRet]
+    target_: Optional[Callable[["QHsm", str], QRet]]
+    # Рабочий буфер do_transition для цепочки предков цели, чтобы не
+    # создавать список на каждом переходе
+    path_: list
+    # Статическая иерархия: обработчик состояния -> обработчик родителя
+    parents_: dict
+    # Для зарегистрированных состояний: (цепочка предков до QHsm_top,
+    # словарь предок -> индекс в цепочке), см. finalize_topology
+    chains_: dict
+
+    def __init__(self, initial: Optional[Callable[["QHsm", str], QRet]] = None):
         if initial is None:
             return
-        self.current_: Callable[["QHsm", str], int] = initial
-        self.effective_: Callable[["QHsm", str], int] = initial
-        self.target_: Optional[Callable[["QHsm", str], int]] = None
-
-    def post_init(self, initial: Callable[["QHsm", str], int]):
-        self.current_: Callable[["QHsm", str], int] = initial
-        self.effective_: Callable[["QHsm", str], int] = initial
-        self.target_: Optional[Callable[["QHsm", str], int]] = None
+        self.post_init(initial)
+
+    def post_init(self, initial: Callable[["QHsm", str], QRet]):
+        self.current_ = initial
+        self.effective_ = initial
+        self.target_ = None
+        self.path_ = [None] * Q_MAX_DEPTH
+        self.parents_ = {}
+        self.chains_ = {}
+
+    def register_state(self, state: Callable[["QHsm", str], QRet],
+                       parent: Callable[["QHsm", str], QRet]):
+        """Запоминает родителя состояния, чтобы переходы не вызывали
+        обработчик с пустым сигналом только ради Q_SUPER.
+
+        Регистрировать можно только состояния, родитель которых не
+        меняется; для остальных родитель определяется как раньше.
+        Корневые состояния регистрируются с родителем QHsm_top.
+        """
+        if parent is None:
+            raise ValueError(
+                f"У состояния {state} нет родителя, для корня используйте QHsm_top")
+        self.parents_[state] = parent
+
+    def start(self, event: str):
+        """Выполняет начальный переход из состояния, заданного в post_init."""
+        # effective_ записывается только после вызова: начальное состояние
+        # задает цель через Q_TRAN, а переход идет от вершины иерархии
+        self.current_(self, event)
+        self.effective_ = QHsm_top
+        do_transition(self)
+
+    def finalize_topology(self):
+        """Заранее строит цепочки предков зарегистрированных состояний.
+
+        Общий предок источника и цели перехода тогда находится поиском в
+        готовом словаре цели, а цепочку цели не нужно собирать заново.
+        Состояния, чья цепочка проходит через незарегистрированное
+        состояние или длиннее Q_MAX_DEPTH, обрабатываются как раньше.
+        """
+        parents = self.parents_
+        chains = {}
+        for state in parents:
+            chain = [state]
+            node = state
+            while node != QHsm_top and len(chain) <= Q_MAX_DEPTH:
+                node = parents.get(node)
+                if node is None:
+                    break
+                chain.append(node)
+            if node != QHsm_top or len(chain) > Q_MAX_DEPTH:
+                continue
+            # При повторах в цепочке остается наименьший индекс
+            index_of = {chain[i]: i for i in range(len(chain) - 1, -1, -1)}
+            chains[state] = (tuple(chain), index_of)
+        self.chains_ = chains
 
 
-def QHsm_top(me: "QHsm", event: str) -> int:
+def QHsm_top(me: "QHsm", event: str) -> QRet:
     return Q_RET_IGNORED
 
 
-standard_events = [
-    QEP_EMPTY_SIG_,
-    Q_ENTRY_SIG,
-    Q_EXIT_SIG,
-    Q_INIT_SIG,
-]
-
-
-def do_transition(me: QHsm) -> None:
+def do_transition(me: QHsm, _EMPTY: str = QEP_EMPTY_SIG_,
+                  _EXIT: str = Q_EXIT_SIG) -> None:
+    # Сигналы связаны как аргументы по умолчанию: внутри цикла это
+    # локальные переменные, а не глобальные имена
     source = me.current_
     effective = me.effective_
     target = me.target_
 
+    if source == target and source == effective:
+        # Переход текущего состояния в само себя: подъема к обработавшему
+        # состоянию нет
+        _do_self_transition(me, source)
+        return
+
+    # Выходим из вложенных состояний до того, которое обработало событие;
+    # само оно выходит ниже, поэтому повторного выхода не бывает.
+    # Родитель зарегистрированного состояния берется из таблицы, иначе
+    # он определяется вызовом обработчика с пустым сигналом
+    parents = me.parents_
     while source != effective:
-        source(me, standard_events[2])  # Q_EXIT_SIG
-        source(me, standard_events[0])  # QEP_EMPTY_SIG
-        source = me.effective_
+        source(me, _EXIT)
+        parent = parents.get(source)
+        if parent is None:
+            source(me, _EMPTY)
+            parent = me.effective_
+        source = parent
 
     if source == target:
-        source(me, standard_events[2])  # Q_EXIT_SIG
-        target(me, standard_events[1])  # Q_ENTRY_SIG
-        me.current_ = target
-        me.effective_ = target
-        me.target_ = None
-        return
+        _do_self_transition(me, source)
+    else:
+        _do_lca_transition(me, source, target)
+
+
+def _do_self_transition(me: QHsm, state: Callable[[QHsm, str], QRet],
+                        _ENTRY: str = Q_ENTRY_SIG,
+                        _EXIT: str = Q_EXIT_SIG) -> None:
+    """Переход состояния в само себя: один выход и один вход."""
+    state(me, _EXIT)
+    state(me, _ENTRY)
+    # effective_ возвращаем, т.к. обработчик выхода мог передать сигнал
+    # родителю через Q_SUPER
+    me.current_ = state
+    me.effective_ = state
+    me.target_ = None
 
-    path: list = [None] * Q_MAX_DEPTH
-    top = 0
-    lca = -1
 
-    path[0] = target
-    while target != QHsm_top:
-        if target is not None:
-            target(me, standard_events[0])  # QEP_EMPTY_SIG
-            target = me.effective_
+def _do_lca_transition(me: QHsm, source: Callable[[QHsm, str], QRet],
+                       target: Callable[[QHsm, str], QRet],
+                       _EMPTY: str = QEP_EMPTY_SIG_,
+                       _ENTRY: str = Q_ENTRY_SIG, _EXIT: str = Q_EXIT_SIG,
+                       _top: Callable[[QHsm, str], QRet] = QHsm_top) -> None:
+    """Переход через общего предка: выход из source до него и вход в target."""
+    parents = me.parents_
+    chain = me.chains_.get(target)
+    if chain is not None:
+        # Цепочка предков цели и ее индекс построены заранее
+        path, ancestors = chain
+        lca = ancestors.get(source, -1)
+    else:
+        path = me.path_
+        top = 0
+        lca = -1
+
+        path[0] = target
+        while target != _top:
+            parent = parents.get(target)
+            if parent is None:
+                target(me, _EMPTY)
+                parent = me.effective_
+            target = parent
             top += 1
             path[top] = target
             if target == source:
                 lca = top
                 break
-        else:
-            break
 
-    while lca == -1:
-        source(me, standard_events[2])  # Q_EXIT_SIG
-        source(me, standard_events[0])  # QEP_EMPTY_SIG
-        source = me.effective_
-        for i in range(top + 1):
-            if path[i] == source:
-                lca = i
-                break
+        if lca == -1:
+            # Индексы предков цели: поиск общего предка - один поиск в
+            # словаре на каждый шаг вверх от источника (при повторах -
+            # наименьший индекс)
+            ancestors = {path[i]: i for i in range(top, -1, -1)}
 
+    while lca == -1:
+        source(me, _EXIT)
+        parent = parents.get(source)
+        if parent is None:
+            source(me, _EMPTY)
+            parent = me.effective_
+        source = parent
+        lca = ancestors.get(source, -1)
+
+    # Цепочка всегда заканчивается QHsm_top, пустых элементов в ней нет
     target = path[lca]
-    if lca == 0 and target is not None:
-        target(me, standard_events[1])  # Q_ENTRY_SIG
+    if lca == 0:
+        target(me, _ENTRY)
     for i in range(lca - 1, -1, -1):
         target = path[i]
-        if target is not None:
-            target(me, standard_events[1])  # Q_ENTRY_SIG
+        target(me, _ENTRY)
 
     me.current_ = target
     me.effective_ = target
     me.target_ = None
 
 
-def QHsm_ctor(me: QHsm, initial: Callable[[QHsm, str], int]) -> None:
-    me.current_ = initial
-    me.effective_ = initial
-    me.target_ = None
+def QHsm_ctor(me: QHsm, initial: Callable[[QHsm, str], QRet]) -> None:
+    me.post_init(initial)
 
 
 def QMsm_init(me: QHsm, event: str) -> None:
-    me.current_(me, event)
-    me.effective_ = QHsm_top
-    do_transition(me)
+    me.start(event)
+
+
+# Результаты, после которых effective_ возвращается к текущему состоянию.
+# Обработчик может вернуть и None (выбор без подходящей ветки), тогда
+# effective_ не трогается, поэтому это множество, а не ветка else
+_EFFECTIVE_RESET_RESULTS = frozenset((Q_RET_HANDLED, Q_RET_UNHANDLED, Q_RET_IGNORED))
 
 
-def QMsm_dispatch(me: QHsm, event: str) -> int:
-    result = me.current_(me, event)
-    while result == Q_RET_SUPER:
+def QMsm_dispatch(me: QHsm, event: str) -> QRet:
+    # Обработчики меняют только effective_ и target_, поэтому текущее
+    # состояние читается из me один раз
+    current = me.current_
+    result = current(me, event)
+    while result is Q_RET_SUPER:
         result = me.effective_(me, event)
-    if result == Q_RET_TRAN:
+    if result is Q_RET_TRAN:
         do_transition(me)
-    elif result in (Q_RET_HANDLED, Q_RET_UNHANDLED, Q_RET_IGNORED):
-        me.effective_ = me.current_
+    elif result in _EFFECTIVE_RESET_RESULTS:
+        me.effective_ = current
     return result
 
 
-def QMsm_simple_dispatch(me: QHsm, signal: str) -> int:
+def QMsm_simple_dispatch(me: QHsm, signal: str) -> QRet:
     return QMsm_dispatch(me, signal)
 
 # --- Macro equivalents from qhsm.hpp as Python functions ---
 
 
-def Q_UNHANDLED() -> int:
+def Q_UNHANDLED() -> QRet:
     return Q_RET_UNHANDLED
 
 
-def Q_HANDLED() -> int:
+def Q_HANDLED() -> QRet:
     return Q_RET_HANDLED
 
 
-def Q_TRAN(me: QHsm, target: Callable[[QHsm, str], int]) -> int:
+def Q_TRAN(me: QHsm, target: Callable[[QHsm, str], QRet]) -> QRet:
     me.target_ = target
     return Q_RET_TRAN
 
 
-def Q_SUPER(me: QHsm, super_handler: Callable[[QHsm, str], int]) -> int:
+def Q_SUPER(me: QHsm, super_handler: Callable[[QHsm, str], QRet]) -> QRet:
     me.effective_ = super_handler
     return Q_RET_SUPER
 
 
-def QMSM_INIT(me: QHsm, event: str) -> None:
-    QMsm_init(me, event)
-
-
-def QMSM_DISPATCH(me: QHsm, event: str) -> int:
-    return QMsm_dispatch(me, event)
-
-
-def SIMPLE_DISPATCH(me: QHsm, sig: str) -> None:
-    QMsm_dispatch(me, sig)
-
-
-def SIGNAL_DISPATCH(me: QHsm, sig: str) -> None:
-    QMsm_dispatch(me, sig)
-
-
-def PASS_EVENT_TO(obj: QHsm, e: str) -> None:
-    QMsm_dispatch(obj, e)
+# Макросы QP — псевдонимы, а не обертки: лишнего вызова на каждое событие нет
+QMSM_INIT = QMsm_init
+QMSM_DISPATCH = QMsm_dispatch
+SIMPLE_DISPATCH = QMsm_dispatch
+SIGNAL_DISPATCH = QMsm_dispatch
+PASS_EVENT_TO = QMsm_dispatch
 
 
 # ============================================================================
@@ -752,6 +949,9 @@ def PASS_EVENT_TO(obj: QHsm, e: str) -> None:
 
 
 class SchemeComponent(ABC):
+    # Набор атрибутов компонентов фиксирован, поэтому у них нет __dict__
+    __slots__ = ('name',)
+
     def __init__(self, name: str):
         self.name = name
 
@@ -763,28 +963,40 @@ class SchemeComponent(ABC):
 class Reader(SchemeComponent):
     # signals: char_accepted
     # signals: line_finished
+    __slots__ = ('message', 'current_char', 'index', '_msg_len', '_evt_char',
+                 '_evt_end')
+
     def __init__(self, name: str):
         super().__init__(name)
         self.message = ''
         self.current_char = ''
         self.index = 0
+        self._msg_len = 0
+        # read() вызывается на каждый символ, имена событий собираем заранее
+        self._evt_char = f'{name}.char_accepted'
+        self._evt_end = f'{name}.line_finished'
 
     def get_sm_options(self, options: dict):
         self.message = options['message']
+        # Сообщение задается один раз, длину не пересчитываем в read()
+        self._msg_len = len(self.message)
         # self.current_char = self.message[0]
 
     def read(self):
-        if self.index < len(self.message):
-            self.current_char = self.message[self.index]
-            self.index += 1
-            EventLoop.add_event(f'{self.name}.char_accepted')
+        index = self.index
+        if index < self._msg_len:
+            self.current_char = self.message[index]
+            self.index = index + 1
+            EventLoop.add_event(self._evt_char)
             return True
         else:
-            EventLoop.add_event(f'{self.name}.line_finished')
+            EventLoop.add_event(self._evt_end)
             return False
 
 
 class Impulse(SchemeComponent):
+    __slots__ = ()
+
     def impulseA(self):
         # print('impulseA')
         EventLoop.add_event('impulseA', True)
@@ -799,6 +1011,8 @@ class Impulse(SchemeComponent):
 
 
 class Counter(SchemeComponent):
+    __slots__ = ('value',)
+
     def __init__(self, name: str):
         super().__init__(name)
         self.value = 0
@@ -853,6 +1067,18 @@ class GardenerCrashException(Exception):
 
 
 class Gardener:
+    # Таблицы по ориентации (SOUTH=0, NORTH=1, WEST=2, EAST=3): куда
+    # смотрит садовник после поворота и смещение на шаг вперед
+    TURN_LEFT = (3, 2, 0, 1)
+    TURN_RIGHT = (2, 3, 1, 0)
+    TURN_BACK = (1, 0, 3, 2)
+    DX = (0, 0, -1, 1)
+    DY = (1, -1, 0, 0)
+    # Биты walls_mask
+    WALL_LEFT = 1
+    WALL_RIGHT = 2
+    WALL_STRAIGHT = 4
+    WALL_BACK = 8
 
     def __init__(self, N: int, M: int, with_walls: bool = False):
         self.N = N
@@ -879,9 +1105,12 @@ class Gardener:
         self.wall_right_value = 0
         self.wall_straight_value = 0
         self.wall_back_value = 0
+        # Те же стены одним числом, см. WALL_*
+        self.walls_mask = 0
 
     def set_field(self, field: list):
-        self.field = deepcopy(field)
+        # Клетки поля - числа, поэтому достаточно скопировать строки
+        self.field = [list(row) for row in field]
         self.M = len(field)
         self.N = len(field[0])
 
@@ -891,152 +1120,174 @@ class Gardener:
         num_walls = int(total_cells * wall_fraction)
         attempts = 0
         walls_placed = 0
-        # Список всех координат кроме стартовой (0,0)
-        coords = [(i, j) for i in range(M)
-                  for j in range(N) if not (i == 0 and j == 0)]
-        random.shuffle(coords)
-
-        def is_connected(field):
-            # BFS из (0,0), считаем количество достижимых клеток
-            visited = [[False for _ in range(N)] for _ in range(M)]
-            q = deque()
-            q.append((0, 0))
-            visited[0][0] = True
-            reachable = 1
-            while q:
-                x, y = q.popleft()
-                for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    nx, ny = x+dx, y+dy
-                    if 0 <= ny < M and 0 <= nx < N and not visited[ny][nx] and field[ny][nx] != -1:
-                        visited[ny][nx] = True
-                        q.append((nx, ny))
-                        reachable += 1
-            # Количество пустых клеток
-            empty_cells = sum(field[i][j] != -1 for i in range(M)
-                              for j in range(N))
-            return reachable == empty_cells
-        for x, y in coords:
+        # Номера всех клеток кроме стартовой (0,0), клетка - divmod(номер, M)
+        cells = list(range(1, total_cells))
+        random.shuffle(cells)
+
+        # Свободные клетки строки y - биты числа pass_rows[y] (бит x)
+        pass_rows = [sum(1 << j for j in range(N) if row[j] != -1)
+                     for row in self.field]
+        # Количество свободных клеток меняется на одну при каждой
+        # поставленной или убранной стене, поле заново не пересчитываем
+        open_cells = sum(r.bit_count() for r in pass_rows)
+        # Порядок проходов заливки: сверху вниз и обратно
+        sweep = list(range(M)) + list(range(M - 2, 0, -1))
+
+        def flood(rows, visited, targets=()):
+            # Заливка целыми строками: посещенные клетки строки растекаются
+            # влево-вправо и переходят в соседние строки, пока заливка не
+            # перестанет меняться или не дойдет до всех клеток targets
+            changed = True
+            while changed:
+                changed = False
+                for i in sweep:
+                    old = visited[i]
+                    row = rows[i]
+                    grow = old
+                    if i:
+                        grow |= visited[i - 1]
+                    if i + 1 < M:
+                        grow |= visited[i + 1]
+                    grow &= row
+                    while True:
+                        wider = (grow | (grow << 1) | (grow >> 1)) & row
+                        if wider == grow:
+                            break
+                        grow = wider
+                    if grow != old:
+                        visited[i] = grow
+                        changed = True
+                if targets and all(visited[ty] >> tx & 1 for tx, ty in targets):
+                    return
+
+        def is_connected():
+            # Заливка из (0,0). Стартовая клетка считается достижимой,
+            # даже если она стена
+            rows = list(pass_rows)
+            rows[0] |= 1
+            visited = [0] * M
+            visited[0] = 1
+            flood(rows, visited)
+            reachable = sum(v.bit_count() for v in visited)
+            return reachable == open_cells
+
+        def neighbours_connected(x, y):
+            # Связное поле без клетки (x, y) связно, если ее свободные
+            # соседи достижимы друг из друга. Заливка идет от одного соседа
+            # и останавливается, как только дошла до остальных
+            neighbours = [(nx, ny) for nx, ny in ((x-1, y), (x+1, y), (x, y-1), (x, y+1))
+                          if 0 <= ny < M and 0 <= nx < N and pass_rows[ny] >> nx & 1]
+            if len(neighbours) <= 1:
+                return True
+            (sx, sy), targets = neighbours[0], neighbours[1:]
+            visited = [0] * M
+            visited[sy] = 1 << sx
+            flood(pass_rows, visited, targets)
+            return all(visited[ty] >> tx & 1 for tx, ty in targets)
+
+        # Пока поле связно, стену проверяем только по ее соседям; поле
+        # остается связным, т.к. ставятся только такие стены. Стартовая
+        # клетка-стена считается достижимой, такое поле может пройти
+        # проверку и без настоящей связности - тогда проверяется все поле
+        connected = self.field[0][0] != -1 and is_connected()
+        for cell in cells:
             if walls_placed >= num_walls or attempts >= max_attempts:
                 break
+            x, y = divmod(cell, M)
             if self.field[y][x] == 0:
                 self.field[y][x] = -1
-                if is_connected(self.field):
+                pass_rows[y] &= ~(1 << x)
+                open_cells -= 1
+                if neighbours_connected(x, y) if connected else is_connected():
                     walls_placed += 1
                 else:
                     self.field[y][x] = 0
+                    pass_rows[y] |= 1 << x
+                    open_cells += 1
             attempts += 1
         # print(f"Walls placed: {walls_placed}")
 
     def update_walls(self):
         # Обновляет значения wall_left_value, wall_right_value, wall_straight_value, wall_back_value
-        dir_left = {
-            self.NORTH: self.WEST,
-            self.WEST: self.SOUTH,
-            self.SOUTH: self.EAST,
-            self.EAST: self.NORTH
-        }[self.orientation]
-        dir_right = {
-            self.NORTH: self.EAST,
-            self.EAST: self.SOUTH,
-            self.SOUTH: self.WEST,
-            self.WEST: self.NORTH
-        }[self.orientation]
-        dir_back = {
-            self.NORTH: self.SOUTH,
-            self.SOUTH: self.NORTH,
-            self.EAST: self.WEST,
-            self.WEST: self.EAST
-        }[self.orientation]
-        self.wall_left_value = 1 if self._wall_in_direction(dir_left) else 0
-        self.wall_right_value = 1 if self._wall_in_direction(dir_right) else 0
-        self.wall_straight_value = 1 if self._wall_in_direction(
-            self.orientation) else 0
-        self.wall_back_value = 1 if self._wall_in_direction(dir_back) else 0
+        # Все четыре направления проверяются в одном проходе по таблицам,
+        # клетка за краем поля считается стеной
+        x, y, o = self.x, self.y, self.orientation
+        field, M, N = self.field, self.M, self.N
+        DX, DY = self.DX, self.DY
+        walls = []
+        for d in (self.TURN_LEFT[o], self.TURN_RIGHT[o], o, self.TURN_BACK[o]):
+            nx, ny = x + DX[d], y + DY[d]
+            walls.append(1 if not (0 <= ny < M and 0 <= nx < N)
+                         or field[ny][nx] == -1 else 0)
+        (self.wall_left_value, self.wall_right_value,
+         self.wall_straight_value, self.wall_back_value) = walls
+        self.walls_mask = (walls[0] | walls[1] << 1 | walls[2] << 2
+                           | walls[3] << 3)
 
     def wall_left(self):
-        return self.wall_left_value == 1
+        return bool(self.walls_mask & self.WALL_LEFT)
 
     def wall_right(self):
-        return self.wall_right_value == 1
+        return bool(self.walls_mask & self.WALL_RIGHT)
 
     def wall_straight(self):
-        return self.wall_straight_value == 1
+        return bool(self.walls_mask & self.WALL_STRAIGHT)
 
     def wall_back(self):
-        return self.wall_back_value == 1
+        return bool(self.walls_mask & self.WALL_BACK)
 
     def get_current_flower(self):
         return self.field[self.y][self.x]
 
-    def _wall_in_direction(self, direction):
-        dx, dy = 0, 0
-        if direction == self.NORTH:
-            dx, dy = 0, -1
-        elif direction == self.SOUTH:
-            dx, dy = 0, 1
-        elif direction == self.WEST:
-            dx, dy = -1, 0
-        elif direction == self.EAST:
-            dx, dy = 1, 0
-        nx, ny = self.x + dx, self.y + dy
-        if 0 <= ny < self.M and 0 <= nx < self.N:
-            return self.field[ny][nx] == -1
-        else:
-            return True
+
+# Компоненты садовника получают его в get_sm_options и сразу проверяют,
+# а init_components вызывает get_sm_options при создании компонента.
+# Поэтому свойства и действия обращаются к self.gardener без проверки
 
 
 class Sensor(SchemeComponent):
+    __slots__ = ('gardener', 'flower', '_evt_got_walls', '_evt_no_walls',
+                 '_evt_flowers_scanned')
+
     def __init__(self, name: str):
         super().__init__(name)
         self.gardener = None
         self.flower = -1
+        # Имена событий не меняются, собираем их один раз
+        self._evt_got_walls = f'{name}.got_walls'
+        self._evt_no_walls = f'{name}.no_walls'
+        self._evt_flowers_scanned = f'{name}.flowers_scanned'
 
     @property
     def rose(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
         return self.gardener.ROSE
 
     @property
     def mint(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
         return self.gardener.MINT
 
     @property
     def vasilek(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
         return self.gardener.VASILEK
 
     @property
     def empty(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
         return self.gardener.EMPTY
 
     @property
     def wall_back(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.wall_back_value
 
     @property
     def wall_straight(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.wall_straight_value
 
     @property
     def wall_right(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.wall_right
 
     @property
     def north(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.NORTH
 
     def get_sm_options(self, options: dict):
@@ -1049,40 +1300,32 @@ class Sensor(SchemeComponent):
         self.flower = gardener.get_current_flower()
 
     def search_walls(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
         self.gardener.update_walls()
-        got_walls = False
-        if self.gardener.wall_right():
-            # EventLoop.add_event(f'{self.name}.wall_right')
-            got_walls = True
-        if self.gardener.wall_back():
-            # EventLoop.add_event(f'{self.name}.wall_back')
-            got_walls = True
-        if self.gardener.wall_left():
-            # EventLoop.add_event(f'{self.name}.wall_left')
-            got_walls = True
-        if self.gardener.wall_straight():
-            # EventLoop.add_event(f'{self.name}.wall_straight')
-            got_walls = True
-        if got_walls:
-            EventLoop.add_event(f'{self.name}.got_walls')
+        # Есть ли хоть одна стена - один ненулевой бит в маске
+        if self.gardener.walls_mask:
+            EventLoop.add_event(self._evt_got_walls)
         else:
-            EventLoop.add_event(f'{self.name}.no_walls')
+            EventLoop.add_event(self._evt_no_walls)
 
     def search_flowers(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
         self.flower = self.gardener.get_current_flower()
-        EventLoop.add_event(f'{self.name}.flowers_scanned')
+        EventLoop.add_event(self._evt_flowers_scanned)
 
 
 class UserSignal(SchemeComponent):
+    __slots__ = ('_evt_called',)
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._evt_called = f'{name}.isCalled'
+
     def call(self):
-        EventLoop.add_event(f'{self.name}.isCalled', True)
+        EventLoop.add_event(self._evt_called, True)
 
 
 class Flower(SchemeComponent):
+    __slots__ = ('gardener',)
+
     def __init__(self, name: str):
         super().__init__(name)
         self.gardener = None
@@ -1097,8 +1340,6 @@ class Flower(SchemeComponent):
 
     def plant(self, flower: int):
         from pprint import pprint
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
         # print('---------')
         # pprint(self.gardener.field)
 
@@ -1114,6 +1355,8 @@ class Flower(SchemeComponent):
 
 
 class Mover(SchemeComponent):
+    __slots__ = ('gardener',)
+
     def __init__(self, name: str):
         super().__init__(name)
         self.gardener = None
@@ -1127,18 +1370,9 @@ class Mover(SchemeComponent):
         self.gardener = gardener
 
     def move_forward(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
-        dx, dy = 0, 0
-        if self.gardener.orientation == self.gardener.NORTH:
-            dx, dy = 0, -1
-        elif self.gardener.orientation == self.gardener.SOUTH:
-            dx, dy = 0, 1
-        elif self.gardener.orientation == self.gardener.WEST:
-            dx, dy = -1, 0
-        elif self.gardener.orientation == self.gardener.EAST:
-            dx, dy = 1, 0
-        nx, ny = self.gardener.x + dx, self.gardener.y + dy
+        orientation = self.gardener.orientation
+        nx = self.gardener.x + self.gardener.DX[orientation]
+        ny = self.gardener.y + self.gardener.DY[orientation]
         # import pprint; pprint.pprint(self.gardener.field); print(nx, ny)
         if 0 <= nx < self.gardener.N and 0 <= ny < self.gardener.M:
             if self.gardener.field[ny][nx] != -1:
@@ -1150,18 +1384,9 @@ class Mover(SchemeComponent):
             raise GardenerCrashException('Crash: out of bounds!')
 
     def move_backward(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
-        dx, dy = 0, 0
-        if self.gardener.orientation == self.gardener.NORTH:
-            dx, dy = 0, 1
-        elif self.gardener.orientation == self.gardener.SOUTH:
-            dx, dy = 0, -1
-        elif self.gardener.orientation == self.gardener.WEST:
-            dx, dy = 1, 0
-        elif self.gardener.orientation == self.gardener.EAST:
-            dx, dy = -1, 0
-        nx, ny = self.gardener.x + dx, self.gardener.y + dy
+        orientation = self.gardener.orientation
+        nx = self.gardener.x - self.gardener.DX[orientation]
+        ny = self.gardener.y - self.gardener.DY[orientation]
         if 0 <= nx < self.gardener.N and 0 <= ny < self.gardener.M:
             if self.gardener.field[ny][nx] != -1:
                 self.gardener.x = nx
@@ -1172,29 +1397,17 @@ class Mover(SchemeComponent):
             raise GardenerCrashException('Crash: out of bounds!')
 
     def turn_left(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
         # Поворот против часовой стрелки
-        self.gardener.orientation = {
-            self.gardener.NORTH: self.gardener.WEST,
-            self.gardener.WEST: self.gardener.SOUTH,
-            self.gardener.SOUTH: self.gardener.EAST,
-            self.gardener.EAST: self.gardener.NORTH
-        }[self.gardener.orientation]
+        self.gardener.orientation = self.gardener.TURN_LEFT[self.gardener.orientation]
 
     def turn_right(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is None!')
         # Поворот по часовой стрелке
-        self.gardener.orientation = {
-            self.gardener.NORTH: self.gardener.EAST,
-            self.gardener.EAST: self.gardener.SOUTH,
-            self.gardener.SOUTH: self.gardener.WEST,
-            self.gardener.WEST: self.gardener.NORTH
-        }[self.gardener.orientation]
+        self.gardener.orientation = self.gardener.TURN_RIGHT[self.gardener.orientation]
 
 
 class Compass(SchemeComponent):
+    __slots__ = ('gardener',)
+
     def __init__(self, name: str):
         super().__init__(name)
         self.gardener = None
@@ -1209,44 +1422,30 @@ class Compass(SchemeComponent):
 
     @property
     def x(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.x
 
     @property
     def y(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.y
 
     @property
     def south(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.SOUTH
 
     @property
     def north(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.NORTH
 
     @property
     def west(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.WEST
 
     @property
     def east(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.EAST
 
     @property
     def orientation(self):
-        if self.gardener is None:
-            raise ValueError('Gardener is required for Compass work!')
         return self.gardener.orientation
 
 
@@ -1316,8 +1515,8 @@ def _parse_data_node(data_dict: dict) -> CGMLDataNode:
     content = data_dict.get('#text')
 
     rect = None
-    if 'rect' in data_dict:
-        rect_data = data_dict['rect']
+    rect_data = data_dict.get('rect')
+    if rect_data is not None:
         rect = CGMLRectNode(
             x=rect_data.get('@x', 0.0),
             y=rect_data.get('@y', 0.0),
@@ -1326,9 +1525,9 @@ def _parse_data_node(data_dict: dict) -> CGMLDataNode:
         )
 
     point = None
-    if 'point' in data_dict:
-        point_data = data_dict['point']
-        if isinstance(point_data, list):
+    point_data = data_dict.get('point')
+    if point_data is not None:
+        if point_data.__class__ is list:
             point = [CGMLPointNode(
                 x=p.get('@x', 0.0), y=p.get('@y', 0.0)) for p in point_data]
         else:
@@ -1366,8 +1565,13 @@ def _parse_edge(edge_dict: dict) -> CGMLEdge:
     )
 
 
-def _parse_node(node_dict: dict) -> CGMLNode:
-    """Parse dictionary into CGMLNode."""
+def _parse_node(node_dict: dict, pending: list) -> CGMLNode:
+    """
+    Parse dictionary into CGMLNode.
+
+    Nested graphs are created without nodes and added to pending together
+    with their dictionaries, their nodes are filled by _parse_graph.
+    """
     data = None
     if 'data' in node_dict:
         data_list = node_dict['data']
@@ -1380,9 +1584,14 @@ def _parse_node(node_dict: dict) -> CGMLNode:
     if 'graph' in node_dict:
         graph_data = node_dict['graph']
         if isinstance(graph_data, list):
-            graph = [_parse_graph(g) for g in graph_data]
+            graph = []
+            for g in graph_data:
+                nested_graph = _parse_graph_without_nodes(g)
+                pending.append((nested_graph, g))
+                graph.append(nested_graph)
         else:
-            graph = _parse_graph(graph_data)
+            graph = _parse_graph_without_nodes(graph_data)
+            pending.append((graph, graph_data))
 
     return CGMLNode(
         id=node_dict.get('@id', ''),
@@ -1391,8 +1600,8 @@ def _parse_node(node_dict: dict) -> CGMLNode:
     )
 
 
-def _parse_graph(graph_dict: dict) -> CGMLGraph:
-    """Parse dictionary into CGMLGraph."""
+def _parse_graph_without_nodes(graph_dict: dict) -> CGMLGraph:
+    """Parse dictionary into CGMLGraph, leaving its nodes empty."""
     data = []
     if 'data' in graph_dict:
         data_list = graph_dict['data']
@@ -1401,14 +1610,6 @@ def _parse_graph(graph_dict: dict) -> CGMLGraph:
         else:
             data = _parse_data_node(data_list)
 
-    node = None
-    if 'node' in graph_dict:
-        node_data = graph_dict['node']
-        if isinstance(node_data, list):
-            node = [_parse_node(n) for n in node_data]
-        else:
-            node = _parse_node(node_data)
-
     edge = None
     if 'edge' in graph_dict:
         edge_data = graph_dict['edge']
@@ -1421,11 +1622,30 @@ def _parse_graph(graph_dict: dict) -> CGMLGraph:
         id=graph_dict.get('@id', ''),
         data=data,
         edgedefault=graph_dict.get('@edgedefault'),
-        node=node,
         edge=edge
     )
 
 
+def _parse_graph(graph_dict: dict) -> CGMLGraph:
+    """
+    Parse dictionary into CGMLGraph.
+
+    Graphs nested into nodes (composite states) are taken from an explicit
+    stack instead of mutual recursion of graph and node parsing.
+    """
+    root = _parse_graph_without_nodes(graph_dict)
+    pending = [(root, graph_dict)]
+    while pending:
+        graph, current_dict = pending.pop()
+        if 'node' in current_dict:
+            node_data = current_dict['node']
+            if isinstance(node_data, list):
+                graph.node = [_parse_node(n, pending) for n in node_data]
+            else:
+                graph.node = _parse_node(node_data, pending)
+    return root
+
+
 def _parse_graphml(graphml_dict: dict) -> CGMLGraphml:
     """Parse dictionary into CGMLGraphml."""
     data = []
@@ -1460,6 +1680,32 @@ def _parse_graphml(graphml_dict: dict) -> CGMLGraphml:
     )
 
 
+# Parsed schemes are pickled to the user's cache directory. Pickles are
+# stamped with the hash of this module's source, so any change of CGML types
+# makes stale pickles ignored; the version covers changes made elsewhere
+_CGML_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'state_machine_visualizer')
+_CGML_CACHE_VERSION = 1
+_CGML_CACHE_ERRORS = (OSError, EOFError, pickle.UnpicklingError,
+                      AttributeError, ImportError)
+
+
+@lru_cache(maxsize=None)
+def _cgml_code_hash() -> Optional[str]:
+    """Return hash of this module's source, None if it can't be read."""
+    try:
+        with open(__file__, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _cgml_cache_path(path: str) -> str:
+    """Return path of the pickle with parsed scheme for given file."""
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(_CGML_CACHE_DIR, f'{digest}.pkl')
+
+
 class CGMLParser:
     """Class that contains functions for parsing CyberiadaML."""
 
@@ -1476,8 +1722,68 @@ class CGMLParser:
         Returns:
             CGMLElements: notes, states, transitions, initial state and components
         """
+        return self._parse_cgml_dict(parse(graphml))
+
+    def parse_cgml_stream(self, graphml: Union[str, IO[bytes]]) -> CGMLElements:
+        """
+        Parse CyberiadaGraphml scheme from file without reading it whole.
+
+        Args:
+            graphml: path to the scheme or file object opened in binary mode.
+
+        Returns:
+            CGMLElements: notes, states, transitions, initial state and components
+        """
+        return self._parse_cgml_dict(parse_stream(graphml))
+
+    def parse_cgml_file(self, path: str) -> CGMLElements:
+        """
+        Parse CyberiadaGraphml scheme from file, reusing cached result.
+
+        Parsed elements are pickled to the cache directory and reused while
+        modification time and size of the file stay the same.
+
+        Args:
+            path: path to the scheme.
+
+        Returns:
+            CGMLElements: notes, states, transitions, initial state and components
+        """
+        st = os.stat(path)
+        stamp = (_CGML_CACHE_VERSION, _cgml_code_hash(),
+                 st.st_mtime_ns, st.st_size)
+        cache_path = _cgml_cache_path(path)
+        try:
+            with open(cache_path, 'rb') as f:
+                if pickle.load(f) == stamp:
+                    self.elements = pickle.load(f)
+                    return self.elements
+        except _CGML_CACHE_ERRORS:
+            # Missing or broken cache is simply rebuilt
+            pass
+
+        elements = self.parse_cgml_stream(path)
+        tmp_path = None
+        try:
+            os.makedirs(_CGML_CACHE_DIR, exist_ok=True)
+            # Each writer gets its own temporary file, so concurrent writes
+            # of the same scheme never end up interleaved in one pickle
+            with tempfile.NamedTemporaryFile(
+                    dir=_CGML_CACHE_DIR, suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                pickle.dump(stamp, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(elements, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        return elements
+
+    def _parse_cgml_dict(self, parsed_dict: Dict[str, Any]) -> CGMLElements:
         self.elements = create_empty_elements()
-        parsed_dict = parse(graphml)
 
         # Create CGML object manually
         graphml_data = parsed_dict['graphml']
@@ -1626,7 +1932,9 @@ class CGMLParser:
         for parameter in splited_parameters:
             if '/' in parameter:
                 parameter_name, parameter_value = parameter.split('/', 1)
-                parameters[parameter_name.strip()] = parameter_value.strip()
+                # Имена и значения (платформа, типы компонентов) повторяются
+                parameters[sys.intern(parameter_name.strip())] = sys.intern(
+                    parameter_value.strip())
         return parameters
 
     def _get_data_content(self, data_node: CGMLDataNode) -> str:
@@ -1846,7 +2154,7 @@ class Action:
 class Signal:
     condition: str
     action: str
-    status: Callable[..., int]
+    status: Callable[..., QRet]
 
     def __str__(self):
         cond = f"[{self.condition}]" if self.condition else ""
@@ -1859,6 +2167,22 @@ class ChoiceSignal(Signal):
     target: str
 
 
+# Операторы условий, более длинные проверяются первыми
+_CONDITION_OPS = (
+    ('==', operator.eq),
+    ('!=', operator.ne),
+    ('>=', operator.ge),
+    ('<=', operator.le),
+    ('>', operator.gt),
+    ('<', operator.lt),
+)
+
+# Действие вида 'компонент.действие(арг1, ...)' и разделитель аргументов
+_ACTION_RE = re.compile(
+    r'^(?P<component>\w+)\.(?P<method>\w+)\((?P<args>.*)\)$')
+_ACTION_ARGS_SEP_RE = re.compile(r',\s*')
+
+
 class StateMachine:
     def __init__(
         self,
@@ -1866,6 +2190,10 @@ class StateMachine:
         sm_parameters: dict
     ):
         self.components = init_components(sm.components, sm_parameters)
+        # Текст действия -> разобранные действия, см. intepreter_action
+        self._action_plans: Dict[str, list] = {}
+        # Текст условия -> разобранное условие, см. intepreter_condition
+        self._condition_plans: Dict[str, Any] = {}
         self.inital_states = init_initial_states(
             self, sm.initial_states, sm.transitions)
         self.final_states = init_final_states(self, sm.finals)
@@ -1886,7 +2214,19 @@ class StateMachine:
         self.initial = find_highest_level_initial_state(self.inital_states)
         if self.initial is None:
             raise ValueError("No initial state found in the state machine.")
-        self.qhsm.post_init(self.initial.execute_signal)
+        self.qhsm.post_init(self.initial.handler)
+
+        # Родители состояний не меняются во время работы, поэтому QHsm
+        # получает их таблицей и не опрашивает обработчики при переходах
+        for element in chain(self.states.values(), self.inital_states.values(),
+                             self.final_states.values(), self.choice_states.values()):
+            try:
+                self.qhsm.register_state(element.handler, element.super_handler)
+            except KeyError:
+                # Родителя нет среди состояний - ошибка проявится, только
+                # если переход до него дойдет, как и без таблицы
+                pass
+        self.qhsm.finalize_topology()
 
     def intepreter_condition(self, condition: str) -> bool:
         """
@@ -1896,54 +2236,67 @@ class StateMachine:
         3 == timer.difference
         timer.difference == timer.difference
         """
+        # Условие разбирается один раз, при выполнении читаются только
+        # атрибуты компонентов
+        compiled = self._condition_plans.get(condition)
+        if compiled is None:
+            compiled = self.__compile_condition(condition)
+            self._condition_plans[condition] = compiled
+        if compiled.__class__ is bool:
+            return compiled
+        op_func, left, right = compiled
+        return op_func(self.__resolve_operand(left),
+                       self.__resolve_operand(right))
+
+    def __compile_condition(self, condition: str):
+        """Возвращает готовый результат или (оператор, левый, правый операнд)."""
         if not condition or condition.strip() == "":
             return True
-        # Поддержка: <, >, ==, !=, <=, >=
-        import operator
-        ops = {
-            '>': operator.gt,
-            '<': operator.lt,
-            '==': operator.eq,
-            '!=': operator.ne,
-            '>=': operator.ge,
-            '<=': operator.le,
-        }
         # Поиск оператора
-        for op_str in sorted(ops.keys(), key=len, reverse=True):
+        for op_str, op_func in _CONDITION_OPS:
             if op_str in condition:
                 left, right = condition.split(op_str, 1)
-                left = left.strip()
-                right = right.strip()
-                op_func = ops[op_str]
-                # Попытка привести к числу
-
-                def resolve(val):
-                    def safe_eval(val: str):
-                        try:
-                            tree = ast.parse(val)
-                        except SyntaxError:
-                            return val
-                        for node in tree.body:
-                            if isinstance(node, ast.Expr):
-                                if isinstance(node.value, ast.Constant):
-                                    return ast.literal_eval(node.value)
-                        return val
-                    try:
-                        return float(val) if '.' in val else int(val)
-                    except ValueError:
-                        # Попытка получить значение из компонента
-                        if '.' in val:
-                            comp_name, attr = val.split('.', 1)
-                            comp = self.components.get(comp_name)
-                            if comp and hasattr(comp.obj, attr):
-                                return getattr(comp.obj, attr)
-                        return safe_eval(val)
-                left_val = resolve(left)
-                right_val = resolve(right)
-                return op_func(left_val, right_val)
+                return (op_func, self.__compile_operand(left.strip()),
+                        self.__compile_operand(right.strip()))
         # Если не найден оператор, просто сравниваем на True
         return bool(condition)
 
+    def __compile_operand(self, val: str) -> tuple:
+        """
+        Операнд условия: (None, None, значение) для констант или
+        (компонент, атрибут, значение) для атрибута компонента, где
+        значение используется, если атрибута у компонента нет.
+        """
+        def safe_eval(val: str):
+            try:
+                tree = ast.parse(val)
+            except SyntaxError:
+                return val
+            for node in tree.body:
+                if isinstance(node, ast.Expr):
+                    if isinstance(node.value, ast.Constant):
+                        return ast.literal_eval(node.value)
+            return val
+        # Попытка привести к числу
+        try:
+            return (None, None, float(val) if '.' in val else int(val))
+        except ValueError:
+            pass
+        if '.' in val:
+            comp_name, attr = val.split('.', 1)
+            comp = self.components.get(comp_name)
+            if comp:
+                return (comp.obj, attr, safe_eval(val))
+        return (None, None, safe_eval(val))
+
+    @staticmethod
+    def __resolve_operand(operand: tuple):
+        obj, attr, value = operand
+        # Попытка получить значение из компонента
+        if obj is not None and hasattr(obj, attr):
+            return getattr(obj, attr)
+        return value
+
     def __parse_action(self, actions: str) -> list:
         """
         Парсит строку или строки вида
@@ -1955,54 +2308,100 @@ class StateMachine:
             action = action.strip()
             if not action:
                 continue
-            pattern = r'^(?P<component>\w+)\.(?P<method>\w+)\((?P<args>.*)\)$'
-            match = re.match(pattern, action)
+            match = _ACTION_RE.match(action)
             if not match:
                 raise ValueError(f"Invalid action format: {action}")
             component = match.group('component')
             method = match.group('method')
             args_str = match.group('args').strip()
             if args_str:
-                args = [arg.strip() for arg in re.split(r',\s*', args_str)]
+                args = [arg.strip() for arg in _ACTION_ARGS_SEP_RE.split(args_str)]
             else:
                 args = []
             result.append(Action(
                 component=component, action=method, args=args))
         return result
 
-    def intepreter_action(self, action: str):
-        def resolve(val):
-            try:
-                return float(val) if '.' in val else int(val)
-            except ValueError:
-                # Попытка получить значение из компонента
-                if '.' in val:
-                    comp_name, attr = val.split('.', 1)
-                    comp = self.components.get(comp_name)
-                    if comp and hasattr(comp.obj, attr):
-                        return getattr(comp.obj, attr)
-                return val
-        # если не компонентная структура кода, то просто делаем eval здесь
-        actions_obj = self.__parse_action(action)
-        for action_obj in actions_obj:
+    def __compile_action(self, actions: str) -> list:
+        """
+        Разбирает строку действий один раз: для каждого действия находит
+        компонент и его метод, числовые аргументы переводит в числа.
+        Аргументы-атрибуты компонентов остаются ссылками (компонент,
+        атрибут) и читаются при каждом выполнении.
+        """
+        plan = []
+        for action_obj in self.__parse_action(actions):
             component = self.components.get(action_obj.component)
-            if component:
-                method = getattr(component.obj, action_obj.action, None)
-                args = []
-                for arg in action_obj.args:
-                    args.append(resolve(arg))
-                if callable(method):
-                    method(*args)
+            if not component:
+                continue
+            method = getattr(component.obj, action_obj.action, None)
+            args = []
+            for arg in action_obj.args:
+                try:
+                    args.append((None, float(arg) if '.' in arg else int(arg)))
+                    continue
+                except ValueError:
+                    pass
+                if '.' in arg:
+                    comp_name, attr = arg.split('.', 1)
+                    comp = self.components.get(comp_name)
+                    if comp:
+                        args.append((comp.obj, (attr, arg)))
+                        continue
+                args.append((None, arg))
+            plan.append((component, method, action_obj.action, args))
+        return plan
+
+    def intepreter_action(self, action: str):
+        # Разобранные действия кэшируются по тексту: одно и то же действие
+        # выполняется при каждом срабатывании перехода
+        plan = self._action_plans.get(action)
+        if plan is None:
+            plan = self.__compile_action(action)
+            self._action_plans[action] = plan
+        for component, method, action_name, arg_refs in plan:
+            args = []
+            for obj, value in arg_refs:
+                if obj is None:
+                    args.append(value)
                 else:
-                    raise ValueError(
-                        f"Action {action_obj.action} not \
-                            callable on {component.type}")
+                    # Попытка получить значение из компонента
+                    attr, raw = value
+                    args.append(getattr(obj, attr) if hasattr(obj, attr) else raw)
+            if callable(method):
+                method(*args)
+            else:
+                raise ValueError(
+                    f"Action {action_name} not \
+                        callable on {component.type}")
+
+
+# Служебные сигналы машины состояний (интернированы, как и сигналы QHsm)
+NOCONDITION_SIG = sys.intern('noconditionTransition')
+BREAK_SIG = sys.intern('break')
 
 
 class Element(ABC):
-    def execute_signal(self, qhsm: QHsm, signal_name: str) -> int:
+    def execute_signal(self, qhsm: QHsm, signal_name: str) -> QRet:
         raise NotImplementedError("Subclasses should implement this method.")
 
+    @cached_property
+    def handler(self) -> Callable[[QHsm, str], QRet]:
+        """
+        Обработчик состояния для QHsm (связанный execute_signal).
+
+        Создается один раз: переходы передают и сравнивают один и тот же
+        объект, а не новый связанный метод при каждом Q_SUPER/Q_TRAN.
+        """
+        return self.execute_signal
+
+    @property
+    def super_handler(self) -> Callable[[QHsm, str], QRet]:
+        """Обработчик родителя, которому состояние передает необработанные сигналы."""
+        if self.parent:
+            return self.sm.states[self.parent].handler
+        return QHsm_top
+
 
 class InitialState(Element):
     def __init__(
@@ -2015,15 +2414,15 @@ class InitialState(Element):
         self.target = target
         self.parent = parent
 
-    def execute_signal(self, qhsm: QHsm, signal_name: str) -> int:
-        if signal_name == 'entry':
-            EventLoop.add_event('noconditionTransition')
+    def execute_signal(self, qhsm: QHsm, signal_name: str) -> QRet:
+        if signal_name is Q_ENTRY_SIG:
+            EventLoop.add_event(NOCONDITION_SIG)
             return Q_HANDLED()
-        if signal_name == 'noconditionTransition':
-            return Q_TRAN(qhsm, self.sm.states[self.target].execute_signal)
+        if signal_name is NOCONDITION_SIG:
+            return Q_TRAN(qhsm, self.sm.states[self.target].handler)
 
         if self.parent:
-            return Q_SUPER(qhsm, self.sm.states[self.parent].execute_signal)
+            return Q_SUPER(qhsm, self.sm.states[self.parent].handler)
         else:
             return Q_SUPER(qhsm, QHsm_top)
 
@@ -2034,14 +2433,14 @@ class ChoiceState(Element):
         self.parent = parent
         self.conditions: list[ChoiceSignal] = []
 
-    def execute_signal(self, qhsm: QHsm, signal_name: str) -> int:
-        if signal_name == 'entry':
-            EventLoop.add_event('noconditionTransition')
+    def execute_signal(self, qhsm: QHsm, signal_name: str) -> QRet:
+        if signal_name is Q_ENTRY_SIG:
+            EventLoop.add_event(NOCONDITION_SIG)
             return Q_HANDLED()
             if self.parent:
-                return Q_SUPER(qhsm, self.sm.states[self.parent].execute_signal)
+                return Q_SUPER(qhsm, self.sm.states[self.parent].handler)
         else_signal = None
-        if signal_name == 'noconditionTransition':
+        if signal_name is NOCONDITION_SIG:
             for signal in self.conditions:
                 signal_condition = signal.condition
                 signal_action = signal.action
@@ -2058,7 +2457,7 @@ class ChoiceState(Element):
                 return status
         else:
             if self.parent:
-                return Q_SUPER(qhsm, self.sm.states[self.parent].execute_signal)
+                return Q_SUPER(qhsm, self.sm.states[self.parent].handler)
             else:
                 return Q_SUPER(qhsm, QHsm_top)
 
@@ -2068,13 +2467,17 @@ class FinalState(Element):
         self.sm = sm
         self.parent = parent
 
-    def execute_signal(self, qhsm: QHsm, signal_name: str) -> int:
-        if signal_name == 'entry':
-            EventLoop.add_event('break')
+    def execute_signal(self, qhsm: QHsm, signal_name: str) -> QRet:
+        if signal_name is Q_ENTRY_SIG:
+            EventLoop.add_event(BREAK_SIG)
             return Q_HANDLED()
         # Final state does not handle any other signals
         return Q_SUPER(qhsm, QHsm_top)
 
+    @property
+    def super_handler(self) -> Callable[[QHsm, str], QRet]:
+        return QHsm_top
+
 
 class State(Element):
     def __init__(
@@ -2104,15 +2507,15 @@ class State(Element):
 
         return None
 
-    def execute_signal(self, qhsm: QHsm, signal_name: str) -> int:
+    def execute_signal(self, qhsm: QHsm, signal_name: str) -> QRet:
         signals = self.signals.get(signal_name)
-        if signal_name == 'entry' and self.has_initial_state_child() is not None:
-            EventLoop.add_event('noconditionTransition')
-        if signal_name == 'noconditionTransition':
+        if signal_name is Q_ENTRY_SIG and self.has_initial_state_child() is not None:
+            EventLoop.add_event(NOCONDITION_SIG)
+        if signal_name is NOCONDITION_SIG:
             child = self.has_initial_state_child()
             if child is None:
                 return Q_HANDLED()
-            return Q_TRAN(qhsm, child.execute_signal)
+            return Q_TRAN(qhsm, child.handler)
         if signals:
             else_signal = None
             for signal in signals:
@@ -2128,7 +2531,7 @@ class State(Element):
                 status = else_signal.status()
                 return status
         if self.parent:
-            return Q_SUPER(qhsm, self.sm.states[self.parent].execute_signal)
+            return Q_SUPER(qhsm, self.sm.states[self.parent].handler)
         else:
             return Q_SUPER(qhsm, QHsm_top)
 
@@ -2221,13 +2624,13 @@ def post_init_choice_states(
             # Определяем целевое состояние по target
             target_func = None
             if signal.target in states:
-                target_func = states[signal.target].execute_signal
+                target_func = states[signal.target].handler
             elif signal.target in initials:
-                target_func = initials[signal.target].execute_signal
+                target_func = initials[signal.target].handler
             elif signal.target in finals:
-                target_func = finals[signal.target].execute_signal
+                target_func = finals[signal.target].handler
             elif signal.target in choice_states:
-                target_func = choice_states[signal.target].execute_signal
+                target_func = choice_states[signal.target].handler
             else:
                 raise ValueError(
                     f"Target state '{signal.target}' not found for choice transition.")
@@ -2272,7 +2675,7 @@ def init_states(
                 trans.target) or finals.get(trans.target) or choices.get(trans.target)
             if target is None:
                 continue
-            target_func = target.execute_signal
+            target_func = target.handler
             status_func = partial(Q_TRAN, qhsm, target_func)
             signal = Signal(
                 condition=condition,
@@ -2360,6 +2763,8 @@ def find_highest_level_initial_state(
 
 
 class StateMachineResult:
+    gardener_crashed = False  # Упал ли Gardener во время выполнения
+
     def __init__(self, timeout: bool, signals: list, called_signals: list, components: dict):
         self.timeout = timeout  # Закончилась ли МС по таймауту
         # Сигналы, которые были вызваны (с учетом сигналов по умолчанию)
@@ -2376,22 +2781,27 @@ def run_state_machine(sm: StateMachine,
     """
     EventLoop.clear()
     qhsm = sm.qhsm
-    qhsm.current_(qhsm, 'entry')
+    qhsm.current_(qhsm, Q_ENTRY_SIG)
 
     for event in signals:
         EventLoop.add_event(event)
 
+    # Тело цикла выполняется на каждое событие: нужные функции связаны с
+    # локальными именами, события передаются прямо в QMsm_dispatch
+    get_event = EventLoop.get_event
+    dispatch = QMsm_dispatch
+    now = time.time
     timeout = False
-    start_time = time.time()
+    deadline = now() + timeout_sec
     while True:
-        if time.time() - start_time > timeout_sec:
+        if now() > deadline:
             timeout = True
             break
-        event = EventLoop.get_event()
-        if event is None or event == 'break':
+        event = get_event()
+        if event is None or event is BREAK_SIG:
             break
-        SIMPLE_DISPATCH(qhsm, event)
-    return StateMachineResult(timeout, EventLoop.events, EventLoop.called_events, sm.components)
+        dispatch(qhsm, event)
+    return StateMachineResult(timeout, EventLoop.all_events(), EventLoop.called_events, sm.components)
 
 
 # ============================================================================
@@ -88,3 +88,7 @@ class Style:
                              background=COLORS['settings_bg'],
                              foreground=COLORS['settings_fg'],
                              font=FONTS['normal'])
+        self.style.configure('SettingsHeader.TLabel',
+                             background=COLORS['settings_bg'],
+                             foreground=COLORS['settings_fg'],
+                             font=FONTS['settings_header'])
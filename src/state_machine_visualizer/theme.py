@@ -41,5 +41,7 @@ FONTS = {
     # Увеличил размер шрифта кнопок
     'button': (SIZES['font_family'], 12, 'bold'),
     # Отдельный шрифт для заголовка
-    'sidebar_title': (SIZES['font_family'], 18, 'bold')
+    'sidebar_title': (SIZES['font_family'], 18, 'bold'),
+    # Заголовки колонок в окне настроек
+    'settings_header': (SIZES['font_family'], 10, 'bold')
 }
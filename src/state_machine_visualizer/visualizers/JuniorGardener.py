@@ -1,9 +1,8 @@
 import tkinter as tk
 from tkinter import ttk
-from typing import Dict, Any
 
 from state_machine_visualizer.visualizers.base import BaseVisualizer
-from state_machine_visualizer.simulator import StateMachineResult, run_state_machine, StateMachine, Gardener, GardenerCrashException, EventLoop
+from state_machine_visualizer.simulator import StateMachineResult, run_state_machine, StateMachine, Gardener, GardenerCrashException, EventLoop, CGMLStateMachine
 
 
 # Настройки для визуализации матрицы
@@ -26,22 +25,32 @@ def get_preview_data(file_path):
 
 
 class JuniorGardenerVisualizer(BaseVisualizer):
-    def update_state_machine_data(self, new_data: Dict[str, Any]):
+    def update_state_machine_data(self, new_data: CGMLStateMachine):
         """Обновляет данные машины состояний и UI."""
-        self.state_machine_data = new_data
+        super().update_state_machine_data(new_data)
         # Обновляем инфо-лейбл, если он есть
         if hasattr(self, 'widget') and self.widget:
             for child in self.widget.winfo_children():
                 if isinstance(child, ttk.Label) and "Платформа:" in child.cget("text"):
-                    platform = new_data.get('platform', 'Неизвестно')
-                    name = new_data.get('name', 'Без названия')
-                    states_count = len(new_data.get('states', {}))
-                    transitions_count = len(new_data.get('transitions', {}))
+                    platform = new_data.platform
+                    name = new_data.name
+                    states_count = len(new_data.states)
+                    transitions_count = len(new_data.transitions)
                     info_text = f"Платформа: {platform}\nНазвание: {name}\nСостояний: {states_count}\nПереходов: {transitions_count}"
                     child.config(text=info_text)
-        # Можно добавить обновление матрицы, если требуется
+        # Результат прошлого запуска относится к старой машине состояний,
+        # показываем исходное поле
+        if self.result_field is not None or self.current_gardener is not None:
+            self.result_field = None
+            self.current_gardener = None
+            if hasattr(self, 'matrix_frame'):
+                for widget in self.matrix_frame.winfo_children():
+                    widget.destroy()
+                self.draw_matrix()
+                self.matrix_frame.update_idletasks()
+                self.canvas.configure(scrollregion=self.canvas.bbox("all"))
 
-    def __init__(self, parent, state_machine_data: Dict[str, Any]):
+    def __init__(self, parent, state_machine_data: CGMLStateMachine):
         self.width = 10
         self.height = 8
         self.orientation = 'Юг'  # новый параметр
@@ -107,11 +116,10 @@ class JuniorGardenerVisualizer(BaseVisualizer):
 
         # Информация о машине состояний
         if self.state_machine_data:
-            platform = self.state_machine_data.get('platform', 'Неизвестно')
-            name = self.state_machine_data.get('name', 'Без названия')
-            states_count = len(self.state_machine_data.get('states', {}))
-            transitions_count = len(
-                self.state_machine_data.get('transitions', {}))
+            platform = self.state_machine_data.platform
+            name = self.state_machine_data.name
+            states_count = len(self.state_machine_data.states)
+            transitions_count = len(self.state_machine_data.transitions)
 
             info_text = f"Платформа: {platform}\nНазвание: {name}\nСостояний: {states_count}\nПереходов: {transitions_count}"
         else:
@@ -342,9 +350,7 @@ class JuniorGardenerVisualizer(BaseVisualizer):
             if not self.state_machine_data:
                 raise ValueError("Данные машины состояний не загружены")
 
-            cgml_sm = self.state_machine_data.get('cgml_state_machine')
-            if not cgml_sm:
-                raise ValueError("CGMLStateMachine не найден в данных")
+            cgml_sm = self.state_machine_data
 
             # используем неизменяемое пользователем исходное поле
             gardener.set_field(self.editable_field)
@@ -367,7 +373,7 @@ class JuniorGardenerVisualizer(BaseVisualizer):
             if 'gardener' in locals():
                 self.current_gardener = gardener
                 self.result_field = gardener.field
-            return StateMachineResult(True, EventLoop.events, EventLoop.called_events, sm.components)
+            return StateMachineResult(True, EventLoop.all_events(), EventLoop.called_events, sm.components)
         except Exception as e:
             import tkinter.messagebox as mb
             message_text = str(e)
@@ -385,7 +391,7 @@ class JuniorGardenerVisualizer(BaseVisualizer):
         if hasattr(self, 'widget') and self.widget:
             for child in self.widget.winfo_children():
                 if isinstance(child, ttk.Label) and "Платформа:" in child.cget("text"):
-                    if hasattr(result, 'gardener_crashed'):
+                    if result.gardener_crashed:
                         result_text = f"Результат выполнения:\n"
                         result_text += f"⚠️ Gardener упал во время выполнения!\n"
                         result_text += f"Поле отображается в состоянии до краша.\n"
@@ -1,28 +1,29 @@
 import tkinter as tk
 from tkinter import ttk
-from typing import Dict, Any
 
 from state_machine_visualizer.visualizers.base import BaseVisualizer
-from state_machine_visualizer.simulator import StateMachineResult, run_state_machine, StateMachine
+from state_machine_visualizer.simulator import StateMachineResult, run_state_machine, StateMachine, CGMLStateMachine
 
 
 class JuniorReaderVisualizer(BaseVisualizer):
-    def update_state_machine_data(self, new_data: Dict[str, Any]):
+    def update_state_machine_data(self, new_data: CGMLStateMachine):
         """Обновляет данные машины состояний и UI для Reader."""
-        self.state_machine_data = new_data
+        super().update_state_machine_data(new_data)
         # Обновляем инфо-лейбл, если он есть
         if hasattr(self, 'widget') and self.widget:
             for child in self.widget.winfo_children():
                 if isinstance(child, ttk.Label) and "Платформа:" in child.cget("text"):
-                    platform = new_data.get('platform', 'Неизвестно')
-                    name = new_data.get('name', 'Без названия')
-                    states_count = len(new_data.get('states', {}))
-                    transitions_count = len(new_data.get('transitions', {}))
+                    platform = new_data.platform
+                    name = new_data.name
+                    states_count = len(new_data.states)
+                    transitions_count = len(new_data.transitions)
                     info_text = f"Платформа: {platform}\nНазвание: {name}\nСостояний: {states_count}\nПереходов: {transitions_count}"
                     child.config(text=info_text)
-        # Можно добавить обновление списка сигналов, если требуется
+        # Сигналы прошлого запуска относятся к старой машине состояний
+        if hasattr(self, 'signals_list_frame'):
+            self.update_signals_list([])
 
-    def __init__(self, parent, state_machine_data: Dict[str, Any]):
+    def __init__(self, parent, state_machine_data: CGMLStateMachine):
         super().__init__(parent, state_machine_data)
 
     def create_initial_view(self):
@@ -114,12 +115,8 @@ class JuniorReaderVisualizer(BaseVisualizer):
             if not self.state_machine_data:
                 raise ValueError("Данные машины состояний не загружены")
 
-            # Получаем CGMLStateMachine из уже распарсенных данных
-            cgml_sm = self.state_machine_data.get('cgml_state_machine')
-            if not cgml_sm:
-                raise ValueError("CGMLStateMachine не найден в данных")
-
             # Создаем StateMachine с параметрами для Reader
+            cgml_sm = self.state_machine_data
             sm = StateMachine(cgml_sm, sm_parameters={
                               'message': message, 'speed': speed})
             print(cgml_sm)
@@ -137,5 +134,4 @@ class JuniorReaderVisualizer(BaseVisualizer):
     def update_with_result(self, result: StateMachineResult):
         """Обновляет скроллируемый список сигналов по результату работы машины состояний."""
         print(f"Обновляю отображение Junior Reader с результатом: {result}")
-        if hasattr(result, 'called_signals'):
-            self.update_signals_list(result.called_signals)
+        self.update_signals_list(result.called_signals)
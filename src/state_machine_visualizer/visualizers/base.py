@@ -1,10 +1,10 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict
-from state_machine_visualizer.simulator import StateMachineResult
+from typing import Optional
+from state_machine_visualizer.simulator import StateMachineResult, CGMLStateMachine
 
 class BaseVisualizer(ABC):
     """Базовый класс для всех визуализаторов."""
-    def __init__(self, parent, state_machine_data: Dict[str, Any]):
+    def __init__(self, parent, state_machine_data: CGMLStateMachine):
         self.parent = parent
         self.state_machine_data = state_machine_data
         self.widget = None
@@ -20,19 +20,23 @@ class BaseVisualizer(ABC):
         """Обновляет отображение с результатом работы машины состояний."""
         pass
 
+    def update_state_machine_data(self, new_data: CGMLStateMachine):
+        """Подменяет машину состояний без пересоздания виджетов."""
+        self.state_machine_data = new_data
+
     def get_widget(self):
         """Возвращает виджет визуализатора."""
         return self.widget
 
-    def get_settings(self):
+    def get_settings(self) -> dict:
         """Возвращает настройки визуализатора для окна настроек."""
         return {}
 
-    def apply_settings(self, settings):
+    def apply_settings(self, settings: dict):
         """Применяет настройки к визуализатору."""
         pass
 
-    def run_state_machine(self):
+    def run_state_machine(self) -> Optional[StateMachineResult]:
         """Запускает машину состояний и возвращает результат."""
         # Базовая реализация - возвращает None
         # Должна быть переопределена в конкретных визуализаторах
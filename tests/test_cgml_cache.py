@@ -0,0 +1,61 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from state_machine_visualizer import simulator
+from state_machine_visualizer.simulator import CGMLParser, _cgml_cache_path
+
+SCHEME = os.path.join(os.path.dirname(__file__), os.pardir, 'test.graphml')
+
+
+class CGMLCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        patcher = mock.patch.object(simulator, '_CGML_CACHE_DIR', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache_path = _cgml_cache_path(SCHEME)
+
+    def test_cached_result_matches_parse(self):
+        expected = CGMLParser().parse_cgml_stream(SCHEME)
+        self.assertEqual(CGMLParser().parse_cgml_file(SCHEME), expected)
+        self.assertEqual(os.listdir(self.cache_dir),
+                         [os.path.basename(self.cache_path)])
+        self.assertEqual(CGMLParser().parse_cgml_file(SCHEME), expected)
+
+    def test_stamp_contains_code_hash(self):
+        CGMLParser().parse_cgml_file(SCHEME)
+        with open(self.cache_path, 'rb') as f:
+            stamp = pickle.load(f)
+        self.assertIn(simulator._cgml_code_hash(), stamp)
+
+    def test_broken_cache_is_rebuilt(self):
+        expected = CGMLParser().parse_cgml_file(SCHEME)
+        with open(self.cache_path, 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertEqual(CGMLParser().parse_cgml_file(SCHEME), expected)
+        with open(self.cache_path, 'rb') as f:
+            pickle.load(f)
+            self.assertEqual(pickle.load(f), expected)
+
+    def test_concurrent_writers(self):
+        expected = CGMLParser().parse_cgml_stream(SCHEME)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(
+                lambda _: CGMLParser().parse_cgml_file(SCHEME), range(16)))
+        self.assertTrue(all(result == expected for result in results))
+        # No temporary files are left, only a complete pickle is published
+        self.assertEqual(os.listdir(self.cache_dir),
+                         [os.path.basename(self.cache_path)])
+        with open(self.cache_path, 'rb') as f:
+            pickle.load(f)
+            self.assertEqual(pickle.load(f), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
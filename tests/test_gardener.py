@@ -0,0 +1,89 @@
+import random
+import unittest
+from collections import deque
+
+from state_machine_visualizer.simulator import Gardener
+
+
+# Поля исходного генератора при заданном random.seed: '#' - стена
+SQUARE_FIELDS = {
+    (5, 0.4, 3): [
+        '...##',
+        '.#...',
+        '##.##',
+        '.....',
+        '#.#.#',
+    ],
+    (9, 0.4, 3): [
+        '...#####.',
+        '..####.#.',
+        '.....#...',
+        '.##...##.',
+        '#...#.##.',
+        '..#...#..',
+        '###.#....',
+        '##...#...',
+        '...####..',
+    ],
+    (9, 1.0, 11): [
+        '...###..#',
+        '.#####.##',
+        '..####..#',
+        '#.....#.#',
+        '..###...#',
+        '.#####.##',
+        '##.....##',
+        '#..###...',
+        '#.#######',
+    ],
+}
+
+
+def render(field):
+    return [''.join('#' if cell == -1 else '.' for cell in row) for row in field]
+
+
+def reachable(field):
+    """Клетки без стен, достижимые из (0, 0)."""
+    h, w = len(field), len(field[0])
+    seen = {(0, 0)}
+    queue = deque(seen)
+    while queue:
+        x, y = queue.popleft()
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if (0 <= nx < w and 0 <= ny < h and field[ny][nx] != -1
+                    and (nx, ny) not in seen):
+                seen.add((nx, ny))
+                queue.append((nx, ny))
+    return seen
+
+
+class GenerateWallsTest(unittest.TestCase):
+    def test_square_fields_match_fixed_seed(self):
+        for (size, fraction, seed), expected in SQUARE_FIELDS.items():
+            with self.subTest(size=size, fraction=fraction, seed=seed):
+                random.seed(seed)
+                gardener = Gardener(size, size)
+                gardener.generate_walls(fraction)
+                self.assertEqual(render(gardener.field), expected)
+
+    def test_non_square_fields_stay_connected(self):
+        rnd = random.Random(0)
+        for seed in range(200):
+            w, h = rnd.randint(1, 15), rnd.randint(1, 15)
+            fraction = rnd.choice((0.2, 0.5, 1.0))
+            with self.subTest(w=w, h=h, seed=seed):
+                random.seed(seed)
+                gardener = Gardener(w, h)
+                gardener.generate_walls(fraction)
+                field = gardener.field
+                self.assertEqual(len(field), h)
+                self.assertTrue(all(len(row) == w for row in field))
+                self.assertNotEqual(field[0][0], -1)
+                open_cells = {(x, y) for y in range(h) for x in range(w)
+                              if field[y][x] != -1}
+                self.assertEqual(reachable(field), open_cells)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import random
+import unittest
+
+from state_machine_visualizer.simulator import (
+    QHsm, QHsm_top, QMsm_dispatch, Q_ENTRY_SIG, Q_EXIT_SIG, QEP_EMPTY_SIG_,
+    Q_HANDLED, Q_SUPER, Q_TRAN)
+
+
+# Иерархия: состояние -> родитель (None - корень, родитель QHsm_top)
+TREE = {
+    'A': None,
+    'A1': 'A',
+    'A11': 'A1',
+    'A12': 'A1',
+    'A2': 'A',
+    'B': None,
+    'B1': 'B',
+}
+
+# (состояние, событие) -> цель перехода; цель None - событие обработано
+TRANSITIONS = {
+    ('A11', 'self'): 'A11',
+    ('A11', 'sib'): 'A12',
+    ('A11', 'anc'): 'A',
+    ('A1', 'up'): 'A1',
+    ('A1', 'h'): None,
+    ('A', 'far'): 'B1',
+    ('A', 'deep'): 'A12',
+    ('A2', 'home'): 'A11',
+    ('B1', 'back'): 'A11',
+    ('B', 'cousin'): 'A2',
+}
+
+
+def make_machine(tree, transitions, initial, registered=()):
+    """Собирает QHsm из функций-обработчиков и журнал их входов/выходов.
+
+    registered - состояния, родители которых передаются в таблицу QHsm;
+    для остальных родитель определяется пустым сигналом.
+    """
+    log = []
+    handlers = {}
+
+    def make_handler(name):
+        def handler(me, event):
+            if event is Q_ENTRY_SIG or event is Q_EXIT_SIG:
+                log.append((event, name))
+                return Q_HANDLED()
+            if event is not QEP_EMPTY_SIG_ and (name, event) in transitions:
+                target = transitions[(name, event)]
+                if target is None:
+                    log.append(('handled', name))
+                    return Q_HANDLED()
+                return Q_TRAN(me, handlers[target])
+            parent = tree[name]
+            return Q_SUPER(me, handlers[parent] if parent else QHsm_top)
+        handler.__name__ = name
+        return handler
+
+    for name in tree:
+        handlers[name] = make_handler(name)
+    me = QHsm(handlers[initial])
+    for name in registered:
+        parent = tree[name]
+        me.register_state(handlers[name], handlers[parent] if parent else QHsm_top)
+    me.finalize_topology()
+    return me, log, handlers
+
+
+def run(events, registered=(), initial='A11'):
+    me, log, handlers = make_machine(TREE, TRANSITIONS, initial, registered)
+    states = []
+    for event in events:
+        QMsm_dispatch(me, event)
+        states.append(me.current_.__name__)
+    return log, states
+
+
+ENTRY, EXIT = Q_ENTRY_SIG, Q_EXIT_SIG
+
+# Журнал и состояния исходной реализации (без таблицы родителей)
+EXPECTED_EVENTS = ['self', 'h', 'anc', 'deep', 'up', 'far', 'back',
+                   'sib', 'unknown', 'far', 'cousin', 'home']
+EXPECTED_LOG = [
+    # self: переход в себя - один выход и один вход
+    (EXIT, 'A11'), (ENTRY, 'A11'),
+    # h: обработано родителем, перехода нет
+    ('handled', 'A1'),
+    # anc: переход из A11 в предка A - сам A не покидается
+    (EXIT, 'A11'), (EXIT, 'A1'), (ENTRY, 'A'),
+    # deep: из A в его потомка A12
+    (ENTRY, 'A1'), (ENTRY, 'A12'),
+    # up: обработано A1, цель - само A1
+    (EXIT, 'A12'), (EXIT, 'A1'), (ENTRY, 'A1'),
+    # far: обработано A, переход через вершину в B1
+    (EXIT, 'A1'), (EXIT, 'A'), (ENTRY, 'B'), (ENTRY, 'B1'),
+    # back: из B1 в A11
+    (EXIT, 'B1'), (EXIT, 'B'), (ENTRY, 'A'), (ENTRY, 'A1'), (ENTRY, 'A11'),
+    # sib: в соседнее состояние A12
+    (EXIT, 'A11'), (ENTRY, 'A12'),
+    # unknown: никто не обработал, переходов нет
+    # far, cousin, home
+    (EXIT, 'A12'), (EXIT, 'A1'), (EXIT, 'A'), (ENTRY, 'B'), (ENTRY, 'B1'),
+    (EXIT, 'B1'), (EXIT, 'B'), (ENTRY, 'A'), (ENTRY, 'A2'),
+    (EXIT, 'A2'), (ENTRY, 'A1'), (ENTRY, 'A11'),
+]
+EXPECTED_STATES = ['A11', 'A11', 'A', 'A12', 'A1', 'B1', 'A11',
+                   'A12', 'A12', 'B1', 'A2', 'A11']
+
+REGISTRATIONS = {
+    'none': (),
+    'all': tuple(TREE),
+    # A не зарегистрировано: цепочки A1, A11, A12, A2 не строятся, и для
+    # них работает запасной путь через пустой сигнал
+    'partial': ('A11', 'A12', 'A1', 'B1', 'B'),
+    'leaves': ('A11', 'A12', 'A2', 'B1'),
+}
+
+
+class TransitionOrderTest(unittest.TestCase):
+    def test_entry_exit_order(self):
+        for mode, registered in REGISTRATIONS.items():
+            with self.subTest(registered=mode):
+                log, states = run(EXPECTED_EVENTS, registered)
+                self.assertEqual(log, EXPECTED_LOG)
+                self.assertEqual(states, EXPECTED_STATES)
+
+    def test_topology_skips_unregistered_chains(self):
+        me, _, handlers = make_machine(
+            TREE, TRANSITIONS, 'A11', REGISTRATIONS['partial'])
+        self.assertNotIn(handlers['A11'], me.chains_)
+        self.assertIn(handlers['B1'], me.chains_)
+        path, ancestors = me.chains_[handlers['B1']]
+        self.assertEqual(path, (handlers['B1'], handlers['B'], QHsm_top))
+        self.assertEqual(ancestors[handlers['B']], 1)
+
+    def test_register_state_rejects_missing_parent(self):
+        me = QHsm(QHsm_top)
+        with self.assertRaises(ValueError):
+            me.register_state(QHsm_top, None)
+
+    def test_random_hierarchies_match_unregistered(self):
+        # Таблица родителей не должна менять порядок входов и выходов
+        rnd = random.Random(7)
+        for _ in range(200):
+            size = rnd.randint(1, 7)
+            names = [f'S{i}' for i in range(size)]
+            tree = {}
+            for i, name in enumerate(names):
+                tree[name] = rnd.choice([None] + names[:i]) if i else None
+            events = [f'e{i}' for i in range(4)]
+            transitions = {}
+            for name in names:
+                for event in events:
+                    if rnd.random() < 0.4:
+                        transitions[(name, event)] = rnd.choice(names + [None])
+            initial = rnd.choice(names)
+            sequence = [rnd.choice(events) for _ in range(15)]
+            results = []
+            for registered in ((), tuple(names),
+                               tuple(n for n in names if rnd.random() < 0.5)):
+                me, log, _ = make_machine(tree, transitions, initial, registered)
+                for event in sequence:
+                    QMsm_dispatch(me, event)
+                    log.append(me.current_.__name__)
+                results.append(log)
+            self.assertEqual(results[1], results[0])
+            self.assertEqual(results[2], results[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import io
+import unittest
+
+from state_machine_visualizer.simulator import _HAS_LXML, parse, parse_stream
+
+
+# yEd writes a comment before the root element
+GRAPHML = '''<?xml version="1.0" encoding="UTF-8"?>
+<!--Created by yEd-->
+<?yed-pi version="3.0"?>
+<graphml xmlns="http://graphml.graphdrawing.org/xmlns">
+  <key id="dName" for="node" attr.name="name"/>
+  <graph id="G" edgedefault="directed">
+    <node id="n0"><data key="dName">A</data></node>
+    <node id="n1"><data key="dName">2.5</data></node>
+  </graph>
+</graphml>
+'''
+
+EXPECTED = {
+    'graphml': {
+        'key': {'@id': 'dName', '@for': 'node', '@attr.name': 'name'},
+        'graph': {
+            '@id': 'G',
+            '@edgedefault': 'directed',
+            'node': [
+                {'@id': 'n0', 'data': {'@key': 'dName', '#text': 'A'}},
+                {'@id': 'n1', 'data': {'@key': 'dName', '#text': 2.5}},
+            ],
+        },
+    },
+}
+
+
+class LeadingCommentTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse(GRAPHML), EXPECTED)
+
+    def test_parse_stream(self):
+        self.assertEqual(parse_stream(io.BytesIO(GRAPHML.encode())), EXPECTED)
+
+    @unittest.skipUnless(_HAS_LXML, 'lxml is not installed')
+    def test_lxml_path(self):
+        # The root has no parent, the comment before it must be left alone
+        self.assertEqual(parse(GRAPHML), EXPECTED)
+        self.assertEqual(parse_stream(io.BytesIO(GRAPHML.encode())), EXPECTED)
+
+
+if __name__ == '__main__':
+    unittest.main()